@@ -0,0 +1 @@
+"""Moonstone benchmark suite (runs on Linux with fake Windows modules)."""
@@ -0,0 +1,395 @@
+"""Benchmark cases.
+
+Each case is a generator registered with @case: it receives a scratch
+directory and the installed Windows fakes, prepares its fixtures, yields the
+callable to time and cleans up afterwards. A callable may return a float to
+report its own measurement (e.g. time until the tray appears) instead of the
+wall time of the call.
+"""
+import contextlib
+import random
+import time
+import zipfile
+from pathlib import Path
+
+from benchmarks.fakes import make_zapret_tree
+
+CASES = {}
+
+# Kept alive for the whole run: widgets abort the process once it is collected
+_QT_APP = None
+
+
+def case(name, repeat=10, requires=()):
+    """Register a benchmark case.
+
+    repeat: number of timed runs.
+    requires: importable module names; the case is skipped if any is missing.
+    """
+    def decorator(func):
+        CASES[name] = {
+            "setup": contextlib.contextmanager(func),
+            "repeat": repeat,
+            "requires": tuple(requires),
+        }
+        return func
+    return decorator
+
+
+@contextlib.contextmanager
+def patched(obj, attr, value):
+    """Temporarily replace `obj.attr`."""
+    saved = getattr(obj, attr)
+    setattr(obj, attr, value)
+    try:
+        yield value
+    finally:
+        setattr(obj, attr, saved)
+
+
+@contextlib.contextmanager
+def state_store(path, **kwargs):
+    """Install a StateStore at `path` as the app state and close it afterwards.
+
+    Closing ends its writer thread; otherwise it keeps retrying writes into the
+    deleted scratch directory and slows down the cases that follow.
+    """
+    from src import state
+    store = state.StateStore(path, **kwargs)
+    try:
+        with patched(state, "_store", store):
+            yield store
+    finally:
+        store.close()
+
+
+def _qt_app():
+    """Return the process-wide QApplication (offscreen in the benchmark runner)."""
+    global _QT_APP
+    import sys
+    from PyQt5.QtWidgets import QApplication
+    if _QT_APP is None:
+        _QT_APP = QApplication.instance() or QApplication(sys.argv)
+    return _QT_APP
+
+
+def _large_bat(path, sections):
+    """Write a profile with `sections` --new sections, cycling the stock ones."""
+    templates = [
+        '--filter-udp=443 --hostlist="%LISTS%list-general.txt" --dpi-desync=fake --dpi-desync-repeats=6 '
+        '--dpi-desync-fake-quic="%CONFIGS%quic_initial_www_google_com.bin" --new ^',
+        '--filter-udp=50000-50100 --filter-l7=discord,stun --dpi-desync=fake --dpi-desync-repeats=6 --new ^',
+        '--filter-tcp=80 --hostlist="%LISTS%list-general.txt" --dpi-desync=fake,split2 '
+        '--dpi-desync-autottl=2 --dpi-desync-fooling=md5sig --new ^',
+        '--filter-tcp=443 --hostlist="%LISTS%list-general.txt" --dpi-desync=split2 '
+        '--dpi-desync-split-seqovl=652 --dpi-desync-split-pos=2 '
+        '--dpi-desync-split-seqovl-pattern="%CONFIGS%tls_clienthello_www_google_com.bin" --new ^',
+    ]
+    lines = [
+        'cd /d "%~dp0"',
+        'set "BIN=%~dp0bundled\\"',
+        'set "LISTS=%~dp0lists\\"',
+        'set "CONFIGS=%~dp0configs\\"',
+        '',
+        'start "zapret: bench" /min "%BIN%winws.exe" --wf-tcp=80,443 --wf-udp=443,50000-50099 ^',
+    ]
+    lines += [templates[i % len(templates)] for i in range(sections)]
+    path.write_text("\n".join(lines) + "\n", encoding="cp866")
+    return path
+
+
+def _release_zip(path, platforms=10, files_per_platform=12, file_size=160 * 1024):
+    """Build an archive shaped like a zapret release (~20 MB uncompressed)."""
+    rng = random.Random(1)
+    names = ["windows-x86_64", "windows-x86"] + [f"linux-arch{i}" for i in range(platforms - 2)]
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for platform in names:
+            for i in range(files_per_platform):
+                zf.writestr(f"zapret-v70/binaries/{platform}/file{i}.bin", rng.randbytes(file_size))
+        for i in range(200):
+            zf.writestr(f"zapret-v70/docs/doc{i}.txt", "zapret documentation\n" * 200)
+            zf.writestr(f"zapret-v70/ipset/list{i}.txt", "example.com\n" * 500)
+    return path
+
+
+@case("parse_bat_file_500_profiles", repeat=5)
+def parse_many_profiles(tmp, fakes):
+    from src import service
+    bats = make_zapret_tree(tmp / "zapret", extra_profiles=500)
+    yield lambda: [service.parse_bat_file(bat) for bat in bats]
+
+
+@case("parse_bat_file_5000_sections", repeat=10)
+def parse_large_profile(tmp, fakes):
+    from src import service
+    make_zapret_tree(tmp / "zapret")
+    bat = _large_bat(tmp / "zapret" / "zapret_large.bat", 5000)
+    yield lambda: service.parse_bat_file(bat)
+
+
+@case("state_save_load_x200", repeat=10)
+def state_roundtrip(tmp, fakes):
+    from src import state
+
+    def run():
+        for i in range(100):
+            state.save_state(last_bat=f"profile_{i}", stopped=False)
+            state.load_state()
+            state.save_state(last_bat=None, stopped=True)
+            state.load_state()
+    with state_store(tmp / "moonstone_state.json"):
+        yield run
+
+
+@case("state_flush_100_profiles", repeat=20)
+def state_flush(tmp, fakes):
+    with state_store(tmp / "moonstone_state.json", delay=3600) as store:
+        for i in range(100):
+            store.update(last_bat=f"profile_{i}", stopped=False)
+            store.record_failure(f"profile_{i}", "bench")
+        counter = iter(range(10 ** 9))
+
+        def run():
+            store.update(last_bat=f"profile_{next(counter) % 100}", stopped=False)
+            store.flush()
+        yield run
+
+
+@case("profile_switch", repeat=20)
+def profile_switch(tmp, fakes):
+    from src import service, state
+    bats = make_zapret_tree(tmp / "zapret")
+    counter = iter(range(10 ** 9))
+
+    def run():
+        bat = bats[next(counter) % len(bats)]
+        state.save_state(last_bat=bat.stem, stopped=False)
+        service.start_service(bat, bat.stem)
+    with state_store(tmp / "moonstone_state.json"):
+        yield run
+
+
+@case("update_menu_styles_1000_profiles", repeat=10, requires=("PyQt5", "psutil"))
+def menu_styles(tmp, fakes):
+    from PyQt5.QtWidgets import QMenu
+    from src import ui
+    _qt_app()
+    start_menu = QMenu("Start")
+    actions = {}
+    for i in range(1000):
+        bat = Path(f"zapret_{i:04d}.bat")
+        actions[bat] = start_menu.addAction(bat.stem)
+    counter = iter(range(10 ** 9))
+    yield lambda: ui.update_menu_styles(start_menu, actions, f"zapret_{next(counter) % 1000:04d}")
+    start_menu.deleteLater()
+
+
+@case("updater_extract_zip", repeat=5, requires=("requests",))
+def extract_zip(tmp, fakes):
+    from src import updater
+    archive = _release_zip(tmp / "zapret_latest.zip")
+    counter = iter(range(10 ** 9))
+    yield lambda: updater._extract_zip(archive, tmp / f"extract_{next(counter)}")
+
+
+@case("updater_find_windows_bin", repeat=20, requires=("requests",))
+def find_windows_bin(tmp, fakes):
+    from src import updater
+    archive = _release_zip(tmp / "zapret_latest.zip")
+    root = updater._extract_zip(archive, tmp / "extracted")
+    # Search from above the release folder so the rglob fallback is exercised
+    yield lambda: updater._find_windows_bin(root)
+
+
+@case("startup_to_tray", repeat=25, requires=("PyQt5", "psutil"))
+def startup_to_tray(tmp, fakes):
+    from PyQt5.QtWidgets import QSystemTrayIcon
+    from src import config, main, monitor, ui, watchdog
+    make_zapret_tree(tmp / "zapret")
+    shown = {}
+    # Background workers started by create_tray_app(), stopped after every run
+    workers = []
+
+    class _ResourceMonitor(monitor.ResourceMonitor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            workers.append(self)
+
+    class _ConnectivityWatchdog(watchdog.ConnectivityWatchdog):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            workers.append(self)
+
+    class _Application:
+        """Reuses the single QApplication and returns instead of entering the loop."""
+
+        def __init__(self, argv):
+            self._app = _qt_app()
+
+        def setQuitOnLastWindowClosed(self, value):
+            self._app.setQuitOnLastWindowClosed(value)
+
+        def exec_(self):
+            return 0
+
+    class _TrayIcon(QSystemTrayIcon):
+        def show(self):
+            super().show()
+            shown.setdefault("at", time.perf_counter())
+
+    def run():
+        shown.clear()
+        started = time.perf_counter()
+        try:
+            main.main()
+        except SystemExit:
+            pass
+        finally:
+            # Otherwise their threads outlive the fakes and call the real sc.exe
+            while workers:
+                workers.pop().stop()
+        return shown["at"] - started
+
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(patched(config, "BAT_DIR", tmp / "zapret"))
+        stack.enter_context(state_store(tmp / "moonstone_state.json"))
+        stack.enter_context(patched(ui, "QApplication", _Application))
+        stack.enter_context(patched(ui, "QSystemTrayIcon", _TrayIcon))
+        stack.enter_context(patched(monitor, "ResourceMonitor", _ResourceMonitor))
+        stack.enter_context(patched(watchdog, "ConnectivityWatchdog", _ConnectivityWatchdog))
+        yield run
+
+
+@case("monitor_sample", repeat=50, requires=("psutil",))
+def monitor_sample(tmp, fakes):
+    import subprocess
+    import sys
+    from src import monitor, service
+    # Stand-in for winws.exe: the fake SCM reports its PID for the running service
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(600)"])
+    fakes.scm.pid = child.pid
+    bats = make_zapret_tree(tmp / "zapret")
+    service.start_service(bats[0], bats[0].stem)
+    resource_monitor = monitor.ResourceMonitor(history=100)
+    resource_monitor.set_profile(bats[0].stem)
+    try:
+        yield resource_monitor.sample
+    finally:
+        child.kill()
+        child.wait()
+
+
+@case("logon_restore_cold", repeat=20)
+def logon_restore_cold(tmp, fakes):
+    # Model the cost of spawning sc.exe so the number of calls shows in the timing
+    fakes.scm.latency = 0.01
+    from src import main
+    bats = make_zapret_tree(tmp / "zapret")
+
+    def run():
+        # No service yet: it has to be created and started
+        fakes.scm.services.clear()
+        assert main.restore_last_profile(bats)
+    with state_store(tmp / "moonstone_state.json") as store:
+        store.update(last_bat=bats[0].stem, stopped=False)
+        yield run
+
+
+@case("logon_restore_warm", repeat=20)
+def logon_restore_warm(tmp, fakes):
+    # Model the cost of spawning sc.exe so the number of calls shows in the timing
+    fakes.scm.latency = 0.01
+    from src import main, service
+    bats = make_zapret_tree(tmp / "zapret")
+    # The auto-start service was already started at boot with the same profile
+    service.start_service(bats[0], bats[0].stem)
+
+    def run():
+        assert main.restore_last_profile(bats)
+    with state_store(tmp / "moonstone_state.json") as store:
+        store.update(last_bat=bats[0].stem, stopped=False)
+        yield run
+
+
+@case("replay_100k_flows", repeat=5)
+def replay_flows(tmp, fakes):
+    from src import replay
+    bats = make_zapret_tree(tmp / "zapret")
+    domains = replay.load_hostlist(tmp / "zapret" / "lists" / "list-general.txt")
+    trace = replay.write_csv(tmp / "trace.csv", replay.generate_flows(100000, domains, seed=1))
+
+    def run():
+        replay.analyze(trace, bats[0])
+    yield run
+
+
+@case("replay_read_pcap_20k_flows", repeat=5)
+def replay_read_pcap(tmp, fakes):
+    from src import replay
+    trace = replay.write_pcap(tmp / "trace.pcap", replay.generate_flows(20000, {"example.com"}, seed=1))
+    yield lambda: replay.read_trace(trace)
+
+
+def _hostlists(root, total, lists=4, seed=1):
+    """Write `lists` hostlists with `total` random domains in all. Returns (paths, domains sample)."""
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    paths, sample = [], []
+    for n in range(lists):
+        path = root / f"list-{n}.txt"
+        with open(path, "w", encoding="utf-8") as f:
+            for i in range(total // lists):
+                label = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 12)))
+                domain = f"{label}{i}.{rng.choice(('com', 'net', 'org', 'ru', 'io'))}"
+                f.write(domain + "\n")
+                if rng.random() < 0.001:
+                    sample.append(domain)
+        paths.append(path)
+    return paths, sample
+
+
+@case("hostindex_build_1m_domains", repeat=3)
+def hostindex_build(tmp, fakes):
+    from src import hostindex
+    paths, _ = _hostlists(tmp / "lists", 1000000)
+    yield lambda: hostindex.build_index(paths, tmp / "index", force=True)
+
+
+@case("hostindex_rebuild_one_list_1m", repeat=5)
+def hostindex_rebuild(tmp, fakes):
+    from src import hostindex
+    paths, _ = _hostlists(tmp / "lists", 1000000)
+    small = tmp / "lists" / "list-small.txt"
+    small.write_text("example.com\n", encoding="utf-8")
+    paths.append(small)
+    hostindex.build_index(paths, tmp / "index")
+
+    def run():
+        # Only the edited list is re-read; the rest comes from the per-list key files
+        with open(small, "a", encoding="utf-8") as f:
+            f.write(f"edit{time.perf_counter_ns()}.example.com\n")
+        assert hostindex.build_index(paths, tmp / "index")["changed"] == ["list-small.txt"]
+    yield run
+
+
+@case("hostindex_cold_open_lookup_1m", repeat=50)
+def hostindex_cold_lookup(tmp, fakes):
+    from src import hostindex
+    paths, sample = _hostlists(tmp / "lists", 1000000)
+    hostindex.build_index(paths, tmp / "index")
+    domain = "www." + sample[0]
+
+    def run():
+        with hostindex.HostIndex(tmp / "index") as index:
+            assert index.lookup(domain)
+    yield run
+
+
+@case("hostindex_lookup_1000_domains_1m", repeat=10)
+def hostindex_lookups(tmp, fakes):
+    from src import hostindex
+    paths, sample = _hostlists(tmp / "lists", 1000000)
+    hostindex.build_index(paths, tmp / "index")
+    domains = (["cdn." + d for d in sample] + [f"missing{i}.example" for i in range(1000)])[:1000]
+    with hostindex.HostIndex(tmp / "index") as index:
+        yield lambda: [index.lookup(d) for d in domains]
@@ -0,0 +1,255 @@
+"""Fake Windows modules: win32com Task Scheduler, ctypes.windll and the SCM (sc.exe)."""
+import contextlib
+import ctypes
+import shutil
+import subprocess
+import sys
+import time
+import types
+from pathlib import Path
+
+from src import config, service
+
+
+class _Bag:
+    """Object that accepts any attribute, like the COM task definition objects."""
+
+    def __init__(self, **attrs):
+        self.__dict__.update(attrs)
+
+
+class _Collection:
+    """COM collection with a Create(type) method (Triggers, Actions)."""
+
+    def __init__(self):
+        self.items = []
+
+    def Create(self, kind):
+        item = _Bag(Type=kind)
+        self.items.append(item)
+        return item
+
+
+class FakeTaskFolder:
+    """Root folder of the fake Task Scheduler."""
+
+    def __init__(self):
+        self.tasks = {}
+
+    def RegisterTaskDefinition(self, name, definition, flags, user, password, logon_type):
+        self.tasks[name] = definition
+        return definition
+
+    def GetTask(self, name):
+        if name not in self.tasks:
+            raise Exception(f"The system cannot find the file specified: {name}")
+        return self.tasks[name]
+
+    def DeleteTask(self, name, flags):
+        self.GetTask(name)
+        del self.tasks[name]
+
+
+class FakeTaskScheduler:
+    """Stand-in for the `Schedule.Service` COM object."""
+
+    def __init__(self):
+        self.folder = FakeTaskFolder()
+        self.connected = False
+
+    def Connect(self):
+        self.connected = True
+
+    def GetFolder(self, path):
+        return self.folder
+
+    def NewTask(self, flags):
+        return _Bag(
+            RegistrationInfo=_Bag(),
+            Triggers=_Collection(),
+            Actions=_Collection(),
+            Settings=_Bag(),
+            Principal=_Bag(),
+        )
+
+
+class FakeShell32:
+    """Stand-in for `ctypes.windll.shell32`."""
+
+    def __init__(self, admin=True):
+        self.admin = admin
+        self.elevations = []
+
+    def IsUserAnAdmin(self):
+        return 1 if self.admin else 0
+
+    def ShellExecuteW(self, hwnd, verb, file, params, directory, show):
+        self.elevations.append((verb, file, params))
+        return 42
+
+
+class FakeSCM:
+    """In-memory Service Control Manager answering sc.exe command lines.
+
+    latency: seconds to sleep per sc.exe call, to model the real process spawn.
+    pid: PID reported by `sc.exe queryex` for running services.
+    """
+
+    def __init__(self, latency=0.0, pid=4242):
+        self.latency = latency
+        self.pid = pid
+        self.services = {}
+        self.calls = []
+
+    def run(self, cmd, **kwargs):
+        """Drop-in for `subprocess.run` as used by `src.service`."""
+        argv = cmd if isinstance(cmd, list) else _split(cmd)
+        self.calls.append(argv)
+        if self.latency:
+            time.sleep(self.latency)
+        if len(argv) < 3 or Path(argv[0]).name.lower() != "sc.exe":
+            return subprocess.CompletedProcess(argv, 1, "", f"unexpected command: {cmd}")
+        verb, name = argv[1].lower(), argv[2]
+        handler = getattr(self, f"_sc_{verb}", None)
+        if handler is None:
+            return subprocess.CompletedProcess(argv, 1, "", f"unsupported sc.exe verb: {verb}")
+        if verb != "create" and name not in self.services:
+            return subprocess.CompletedProcess(argv, 1060, _MISSING, "")
+        return handler(argv, name)
+
+    def _sc_query(self, argv, name):
+        svc = self.services[name]
+        code = 4 if svc["state"] == "RUNNING" else 1
+        out = (f"\nSERVICE_NAME: {name}\n"
+               f"        TYPE               : 10  WIN32_OWN_PROCESS\n"
+               f"        STATE              : {code}  {svc['state']}\n")
+        return subprocess.CompletedProcess(argv, 0, out, "")
+
+    def _sc_queryex(self, argv, name):
+        pid = self.pid if self.services[name]["state"] == "RUNNING" else 0
+        out = self._sc_query(argv, name).stdout + f"        PID                : {pid}\n"
+        return subprocess.CompletedProcess(argv, 0, out, "")
+
+    def _sc_qc(self, argv, name):
+        svc = self.services[name]
+        out = (f"[SC] QueryServiceConfig SUCCESS\n\nSERVICE_NAME: {name}\n"
+               f"        START_TYPE         : 2   AUTO_START\n"
+               f"        BINARY_PATH_NAME   : {svc['bin_path']}\n"
+               f"        DISPLAY_NAME       : {svc['display_name']}\n")
+        return subprocess.CompletedProcess(argv, 0, out, "")
+
+    def _sc_create(self, argv, name):
+        if name in self.services:
+            return subprocess.CompletedProcess(argv, 1073, "[SC] CreateService FAILED 1073:\n", "")
+        opts = dict(zip(argv[3::2], argv[4::2]))
+        self.services[name] = {
+            "display_name": opts.get("displayname=", name),
+            "bin_path": opts.get("binPath=", ""),
+            "state": "STOPPED",
+        }
+        return subprocess.CompletedProcess(argv, 0, "[SC] CreateService SUCCESS\n", "")
+
+    def _sc_start(self, argv, name):
+        self.services[name]["state"] = "RUNNING"
+        return self._sc_query(argv, name)
+
+    def _sc_stop(self, argv, name):
+        self.services[name]["state"] = "STOPPED"
+        return self._sc_query(argv, name)
+
+    def _sc_delete(self, argv, name):
+        del self.services[name]
+        return subprocess.CompletedProcess(argv, 0, "[SC] DeleteService SUCCESS\n", "")
+
+
+_MISSING = ("[SC] EnumQueryServicesStatus:OpenService FAILED 1060:\n\n"
+            "The specified service does not exist as an installed service.\n")
+
+
+def _split(cmd):
+    """Split an sc.exe command line the way cmd.exe would (double quotes only)."""
+    argv, current, quoted = [], "", False
+    for ch in cmd:
+        if ch == '"':
+            quoted = not quoted
+        elif ch == " " and not quoted:
+            if current:
+                argv.append(current)
+            current = ""
+        else:
+            current += ch
+    if current:
+        argv.append(current)
+    return argv
+
+
+@contextlib.contextmanager
+def windows_fakes(scm=None, admin=True):
+    """Install fake win32com, ctypes.windll and sc.exe for the duration of the block."""
+    scm = scm or FakeSCM()
+    scheduler = FakeTaskScheduler()
+    shell32 = FakeShell32(admin)
+
+    client = types.ModuleType("win32com.client")
+    client.Dispatch = lambda progid: scheduler
+    win32com = types.ModuleType("win32com")
+    win32com.client = client
+
+    saved_modules = {k: sys.modules.get(k) for k in ("win32com", "win32com.client")}
+    saved_windll = getattr(ctypes, "windll", None)
+    saved_subprocess = service.subprocess
+    autostart = sys.modules.get("src.autostart")
+    saved_autostart_com = getattr(autostart, "win32com", None)
+
+    sys.modules["win32com"] = win32com
+    sys.modules["win32com.client"] = client
+    if autostart is not None:
+        autostart.win32com = win32com
+    ctypes.windll = _Bag(shell32=shell32)
+    service.subprocess = types.SimpleNamespace(
+        run=scm.run, CompletedProcess=subprocess.CompletedProcess
+    )
+    try:
+        yield types.SimpleNamespace(scm=scm, scheduler=scheduler, shell32=shell32)
+    finally:
+        service.subprocess = saved_subprocess
+        if autostart is not None:
+            autostart.win32com = saved_autostart_com
+        if saved_windll is None:
+            del ctypes.windll
+        else:
+            ctypes.windll = saved_windll
+        for name, module in saved_modules.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+
+def make_zapret_tree(root, extra_profiles=0):
+    """Copy the bundled profiles and lists into `root` and fake winws.exe.
+
+    extra_profiles: number of additional copies of the first profile to create.
+    Returns the sorted list of .bat files in the new tree.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    for sub in ("lists", "configs"):
+        shutil.copytree(config.BAT_DIR / sub, root / sub, dirs_exist_ok=True)
+        if sys.platform != "win32":
+            # Same "<LISTS>\\name" string concatenation as for winws.exe below
+            linux_dir = root / f"{sub}\\"
+            for path in (root / sub).iterdir():
+                shutil.copy2(path, f"{linux_dir}\\{path.name}")
+    bats = sorted(config.BAT_DIR.glob("*.bat"))
+    for bat in bats:
+        shutil.copy2(bat, root / bat.name)
+    for i in range(extra_profiles):
+        shutil.copy2(bats[0], root / f"zapret_bench_{i:04d}.bat")
+    # parse_bat_file builds "<BIN>\winws.exe" by string concatenation; on Linux
+    # that is a single file name inside `root`, on Windows it is bundled/winws.exe.
+    bin_dir = root / "bundled\\"
+    if sys.platform == "win32":
+        bin_dir.mkdir(exist_ok=True)
+    Path(f"{bin_dir}\\winws.exe").write_bytes(b"MZ")
+    return sorted(root.glob("*.bat"))
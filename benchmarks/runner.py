@@ -0,0 +1,229 @@
+"""Run the benchmark cases, write results to JSON and compare with the baseline."""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+BASELINE_FILE = BENCH_DIR / "baseline.json"
+RESULTS_FILE = BENCH_DIR / "results.json"
+
+# Timings below this difference are treated as noise regardless of the ratio
+MIN_ABS_DELTA = 0.0005
+
+# Seconds a case's worker threads get to finish after its teardown
+THREAD_GRACE = 2.0
+
+
+def _missing(requires):
+    """Return the first module in `requires` that cannot be imported."""
+    for name in requires:
+        if importlib.util.find_spec(name) is None:
+            return name
+    return None
+
+
+def _leaked_threads():
+    """Return the names of threads still alive after THREAD_GRACE seconds."""
+    deadline = time.monotonic() + THREAD_GRACE
+    for thread in threading.enumerate():
+        if thread is not threading.main_thread():
+            thread.join(max(0.0, deadline - time.monotonic()))
+    return [t.name for t in threading.enumerate()
+            if t is not threading.main_thread() and t.is_alive()]
+
+
+def run_case(name, spec):
+    """Run one case and return its result dict."""
+    # Imported lazily so the fakes are installed before any src module
+    from benchmarks.fakes import windows_fakes
+
+    missing = _missing(spec["requires"])
+    if missing:
+        return {"skipped": f"module '{missing}' is not installed"}
+
+    samples = []
+    with tempfile.TemporaryDirectory() as tmp_str, windows_fakes() as fakes:
+        with spec["setup"](Path(tmp_str), fakes) as func:
+            func()  # warm-up
+            for _ in range(spec["repeat"]):
+                started = time.perf_counter()
+                reported = func()
+                elapsed = time.perf_counter() - started
+                samples.append(reported if isinstance(reported, float) else elapsed)
+    leaked = _leaked_threads()
+    if leaked:
+        return {"error": f"threads left running after teardown: {', '.join(leaked)}"}
+    return {
+        "median": round(statistics.median(samples), 6),
+        "min": round(min(samples), 6),
+        "mean": round(statistics.fmean(samples), 6),
+        "repeat": len(samples),
+    }
+
+
+def run_isolated(name):
+    """Run one case in a fresh interpreter, so earlier cases cannot affect it."""
+    with tempfile.TemporaryDirectory() as out_dir:
+        out = Path(out_dir) / "result.json"
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks", "--run-case", name, "--output", str(out)],
+            cwd=BENCH_DIR.parent, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        )
+        if proc.returncode != 0 or not out.exists():
+            tail = proc.stderr.strip().splitlines()[-1:] or [""]
+            return {"error": f"exit code {proc.returncode}: {tail[0]}"}
+        return json.loads(out.read_text(encoding="utf-8"))
+
+
+def run(selected=None):
+    """Run all (or the selected) cases, each in its own process, and return the results document."""
+    from benchmarks.cases import CASES
+
+    results = {}
+    for name in CASES:
+        if selected and not any(s in name for s in selected):
+            continue
+        print(f"{name} ...", end=" ", flush=True)
+        results[name] = res = run_isolated(name)
+        if "median" in res:
+            print(f"{res['median'] * 1000:.3f} ms")
+        else:
+            print(res.get("skipped") or f"ERROR {res['error']}")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Print a comparison table.
+
+    Returns (regressed, missing): names of cases slower than the baseline and of
+    cases that failed or have a baseline entry but were skipped in this run.
+    """
+    regressions, missing = [], []
+    print(f"\n{'case':<36}{'baseline ms':>14}{'current ms':>14}{'ratio':>8}  status")
+    for name, res in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        has_base = bool(base) and "median" in base
+        if "error" in res:
+            missing.append(name)
+            print(f"{name:<36}{'':>14}{'':>14}{'':>8}  ERROR")
+            continue
+        if "skipped" in res:
+            if has_base:
+                missing.append(name)
+            shown = f"{base['median'] * 1000:.3f}" if has_base else ""
+            print(f"{name:<36}{shown:>14}{'':>14}{'':>8}  {'MISSING' if has_base else 'skipped'}")
+            continue
+        if not has_base:
+            print(f"{name:<36}{'-':>14}{res['median'] * 1000:>14.3f}{'':>8}  new")
+            continue
+        ratio = res["median"] / base["median"] if base["median"] else float("inf")
+        regressed = (ratio > 1 + tolerance
+                     and res["median"] - base["median"] > MIN_ABS_DELTA)
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<36}{base['median'] * 1000:>14.3f}{res['median'] * 1000:>14.3f}"
+              f"{ratio:>8.2f}  {'REGRESSION' if regressed else 'ok'}")
+    unbased = [name for name, res in current["results"].items()
+               if "median" not in baseline.get("results", {}).get(name, {})]
+    if unbased:
+        print(f"\nWARNING: no baseline for {len(unbased)} case(s), not compared: {', '.join(unbased)}")
+    return regressions, missing
+
+
+def update_baseline(current, path, partial=False):
+    """Write `current` as the baseline. Returns the process exit code.
+
+    partial: replace only the entries of `current`, keep the other cases.
+    A skipped or failed case never replaces a measured entry.
+    """
+    baseline = {"results": {}}
+    if path.exists():
+        baseline = json.loads(path.read_text(encoding="utf-8"))
+    results = dict(baseline["results"]) if partial else {}
+    kept = []
+    for name, res in current["results"].items():
+        if "median" not in res and "median" in baseline["results"].get(name, {}):
+            results[name] = baseline["results"][name]
+            kept.append(name)
+        else:
+            results[name] = res
+    if kept:
+        print(f"WARNING: skipped or failed case(s) keep their old baseline: {', '.join(kept)}")
+    path.write_text(json.dumps({"meta": current["meta"], "results": results}, indent=2) + "\n",
+                    encoding="utf-8")
+    print(f"Baseline updated: {path}")
+    return 0
+
+
+def _run_case_in_process(name, output):
+    from benchmarks.cases import CASES
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    with tempfile.TemporaryDirectory() as log_dir:
+        # Same logging setup as src/main.py, so logging cost is part of the timings
+        logging.basicConfig(
+            filename=Path(log_dir) / "moonstone.log",
+            filemode="w",
+            level=logging.DEBUG,
+            format='%(asctime)s - %(levelname)s - %(message)s',
+            encoding='utf-8'
+        )
+        result = run_case(name, CASES[name])
+        logging.shutdown()
+    output.write_text(json.dumps(result) + "\n", encoding="utf-8")
+    return 0
+
+
+def main(argv=None):
+    """Command line entry point. Returns the process exit code."""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument("cases", nargs="*", help="run only cases whose name contains one of these")
+    parser.add_argument("--output", type=Path, default=RESULTS_FILE, help="results JSON path")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE, help="baseline JSON path")
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="allowed relative slowdown of the median (default: 0.3)")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="write the results to the baseline instead of comparing; "
+                             "with case filters only those entries are replaced")
+    # Internal: run a single case in this process (used by run_isolated)
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        return _run_case_in_process(args.run_case, args.output)
+
+    current = run(args.cases)
+    args.output.write_text(json.dumps(current, indent=2) + "\n", encoding="utf-8")
+    print(f"\nResults written to {args.output}")
+
+    if args.update_baseline:
+        return update_baseline(current, args.baseline, partial=bool(args.cases))
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, nothing to compare")
+        return 0
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    regressions, missing = compare(current, baseline, args.tolerance)
+    if missing:
+        print(f"\n{len(missing)} baselined case(s) skipped, install their requirements: "
+              f"{', '.join(missing)}")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+    return 1 if regressions or missing else 0
@@ -7,9 +7,9 @@ import win32com.client
 
 # Handle both relative and absolute imports
 try:
-    from .config import TASK_NAME
+    from .config import TASK_NAME, BASE_DIR
 except ImportError:
-    from src.config import TASK_NAME
+    from src.config import TASK_NAME, BASE_DIR
 
 
 def enable_autostart():
@@ -33,6 +33,12 @@ def enable_autostart():
         action = task_def.Actions.Create(0)  # 0 = TASK_ACTION_EXEC
         action.ID = 'MoonstoneStart'
         action.Path = str(Path(sys.executable).resolve())
+        # --logon starts the fast path: restore the profile first, tray afterwards
+        if getattr(sys, 'frozen', False):
+            action.Arguments = '--logon'
+        else:
+            action.Arguments = '-m src.main --logon'
+            action.WorkingDirectory = str(BASE_DIR)
         
         # Настраиваем параметры задачи
         task_def.Settings.Enabled = True
@@ -16,11 +16,42 @@ else:
 ICON_PATH = BASE_DIR / "icons" / "moonstone.ico"
 CHECK_ICON_PATH = BASE_DIR / "icons" / "check.ico"
 BAT_DIR = BASE_DIR / "zapret"
+LISTS_DIR = BAT_DIR / "lists"
+INDEX_DIR = BASE_DIR / "index"
 BUNDLED_DIR = BAT_DIR / "bundled"
 BACKUP_DIR = BAT_DIR / "bundled_backup"
 LOG_FILE = BASE_DIR / "moonstone.log"
 STATE_FILE = BASE_DIR / "moonstone_state.json"
+STATE_FLUSH_DELAY = 0.5  # seconds of quiet before state changes are written
+STATE_RETRY_MAX = 60.0  # max seconds between retries of a failing state write
+LOGON_START_TIMEOUT = 15.0  # seconds to wait for the service to run in --logon mode
 GITHUB_RELEASES_API = "https://api.github.com/repos/bol-van/zapret/releases/latest"
+STATS_DIR = BASE_DIR / "stats"
+
+# Resource monitoring of the running winws.exe
+MONITOR_INTERVAL = 5.0  # seconds between samples
+MONITOR_HISTORY = 720  # samples kept in memory (1 hour at 5 s)
+MONITOR_ALERT_SAMPLES = 3  # consecutive samples over the limit before alerting
+MONITOR_LOOKUP_BACKOFF_MAX = 60.0  # max seconds between lookups of a missing service process
+MONITOR_THRESHOLDS = {
+    "cpu_percent": 80.0,  # % of one core
+    "rss": 256 * 1024 * 1024,  # bytes
+    "handles": 10000,
+    "threads": 200,
+}
+
+# Connectivity watchdog (TLS handshake probes to hosts of the active profile)
+WATCHDOG_ENABLED = True
+WATCHDOG_INTERVAL = 60.0  # seconds between probe rounds
+WATCHDOG_HOSTS = 3  # hosts probed per round
+WATCHDOG_TIMEOUT = 5.0  # seconds per TLS handshake
+WATCHDOG_WINDOW = 600.0  # seconds of probe results used for the success rate
+WATCHDOG_MIN_SAMPLES = 6  # probes needed in the window before judging a profile
+WATCHDOG_DEGRADED_BELOW = 0.5  # success rate that marks the profile degraded
+WATCHDOG_RECOVERED_ABOVE = 0.8  # success rate that marks it healthy again
+WATCHDOG_CONFIRM_ROUNDS = 3  # consecutive degraded rounds before failover
+WATCHDOG_GRACE = 15.0  # seconds without probes after a profile switch
+WATCHDOG_RANKING = []  # profile names in failover order, empty = by failures and uptime
 
 # Encoding
 ENCODING = "cp866"
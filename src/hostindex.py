@@ -0,0 +1,313 @@
+"""Memory-mapped index of all hostlists for "which profile covers this domain" queries.
+
+The index is a single file of sorted reversed domains ("com.youtube.music")
+with a fixed-width offset table, so it can be opened with mmap and searched
+with a binary search without loading it. Each hostlist also keeps its own
+sorted key file; on rebuild only changed lists are re-read and the key files
+are merged.
+
+Usage:
+    python -m src.hostindex build
+    python -m src.hostindex check DOMAIN [DOMAIN ...]
+"""
+import argparse
+import heapq
+import json
+import logging
+import mmap
+import os
+import re
+import shutil
+import struct
+import sys
+import threading
+from array import array
+from pathlib import Path, PureWindowsPath
+
+# Handle both relative and absolute imports
+try:
+    from .config import BAT_DIR, LISTS_DIR, INDEX_DIR, ENCODING
+    from . import service
+    from .replay import normalize_domain
+except ImportError:
+    from src.config import BAT_DIR, LISTS_DIR, INDEX_DIR, ENCODING
+    from src import service
+    from src.replay import normalize_domain
+
+MAGIC = b"MSHIDX01"
+HEADER = struct.Struct("<8sQ")  # magic, record count
+OFFSET = struct.Struct("<Q")
+INDEX_FILE = "hostlists.idx"
+MANIFEST_FILE = "manifest.json"
+
+# Serializes builds: they share the temp files in the index directory
+_build_lock = threading.Lock()
+
+# Hostlist lines that are not domains (e.g. WinDivert filters in lists/, whose
+# "or"/"and" lines would pass a plain word check) are skipped: at least one dot
+DOMAIN_RE = re.compile(r"^[\w-]+(\.[\w-]+)+$")
+
+
+def reverse_key(domain):
+    """Return the index key of a domain: labels reversed, UTF-8 encoded."""
+    return ".".join(reversed(domain.split("."))).encode("utf-8")
+
+
+def suffix_keys(domain):
+    """Return the keys of a domain and all its parent domains, longest first."""
+    labels = domain.strip().lower().rstrip(".").split(".")
+    return [".".join(reversed(labels[i:])).encode("utf-8") for i in range(len(labels))]
+
+
+def default_hostlists():
+    """Return the hostlist files of the bundled zapret (LISTS_DIR/*.txt)."""
+    return sorted(LISTS_DIR.glob("*.txt"))
+
+
+def _section_filters(tokens):
+    return " ".join(t for t in tokens if t.startswith(("--filter-tcp", "--filter-udp", "--filter-l7")))
+
+
+def profile_coverage(bat_files):
+    """Return {hostlist file name: [(profile, section index, filters)]} for all profiles."""
+    coverage = {}
+    for bat in bat_files:
+        try:
+            _, args = service.parse_bat_file(bat)
+        except SystemExit as e:  # parse_bat_file exits on broken profiles
+            logging.error(f"Пропуск профиля {bat.name}: {e}")
+            continue
+        _, sections = service.split_sections(args)
+        for index, tokens in enumerate(sections):
+            for token in tokens:
+                if token.startswith("--hostlist="):
+                    name = PureWindowsPath(token.partition("=")[2].strip('"')).name
+                    coverage.setdefault(name, []).append((bat.stem, index, _section_filters(tokens)))
+    return coverage
+
+
+def _read_keys(path):
+    """Read a hostlist into a sorted list of unique index keys."""
+    keys = set()
+    with open(path, "r", encoding=ENCODING, errors="ignore") as f:
+        for line in f:
+            entry = normalize_domain(line)
+            if entry and DOMAIN_RE.match(entry):
+                keys.add(reverse_key(entry))
+    return sorted(keys)
+
+
+def _load_manifest(index_dir):
+    try:
+        with open(index_dir / MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"lists": {}}
+
+
+def build_index(list_paths=None, index_dir=INDEX_DIR, force=False):
+    """Build or incrementally update the index. Returns a summary dict."""
+    with _build_lock:
+        return _build_index(list_paths, index_dir, force)
+
+
+def _build_index(list_paths, index_dir, force):
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    list_paths = [Path(p) for p in (default_hostlists() if list_paths is None else list_paths)]
+    manifest = _load_manifest(index_dir)
+    old_lists = manifest["lists"]
+    new_lists, changed = {}, []
+    used_ids = {entry["id"] for entry in old_lists.values()}
+    next_id = max(used_ids, default=-1) + 1
+
+    for path in list_paths:
+        stat = path.stat()
+        key = str(path)
+        entry = old_lists.get(key)
+        keys_file = index_dir / f"list_{entry['id']}.keys" if entry else None
+        if (not force and entry and entry["mtime"] == stat.st_mtime_ns
+                and entry["size"] == stat.st_size and keys_file.exists()):
+            new_lists[key] = entry
+            continue
+        if entry is None:
+            entry = {"id": next_id, "name": path.name}
+            next_id += 1
+        keys = _read_keys(path)
+        with open(index_dir / f"list_{entry['id']}.keys", "wb") as f:
+            f.writelines(k + b"\n" for k in keys)
+        entry.update(mtime=stat.st_mtime_ns, size=stat.st_size, count=len(keys))
+        new_lists[key] = entry
+        changed.append(path.name)
+
+    removed = [e for k, e in old_lists.items() if k not in new_lists]
+    for entry in removed:
+        (index_dir / f"list_{entry['id']}.keys").unlink(missing_ok=True)
+
+    index_path = index_dir / INDEX_FILE
+    if changed or removed or not index_path.exists():
+        count = _merge(index_dir, new_lists, index_path)
+        manifest = {"lists": new_lists, "count": count}
+        tmp = index_dir / (MANIFEST_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, index_dir / MANIFEST_FILE)
+        logging.info(f"Индекс хостов обновлён: {count} доменов, изменены списки: {changed}")
+    return {"lists": len(new_lists), "changed": changed,
+            "removed": [e["name"] for e in removed], "domains": manifest.get("count", 0)}
+
+
+def _merge(index_dir, lists, index_path):
+    """Merge the per-list key files into the index file. Returns the record count."""
+    files = [open(index_dir / f"list_{e['id']}.keys", "rb") for e in lists.values()]
+    offsets = array("Q")
+    data_tmp = index_path.with_name(index_path.name + ".data")
+    try:
+        streams = [_tagged(f, str(e["id"]).encode("ascii")) for f, e in zip(files, lists.values())]
+        with open(data_tmp, "wb") as data:
+            position = 0
+            current, ids = None, []
+            for key, list_id in heapq.merge(*streams):
+                if key != current:
+                    if current is not None:
+                        record = current + b"\x00" + b",".join(ids) + b"\n"
+                        offsets.append(position)
+                        data.write(record)
+                        position += len(record)
+                    current, ids = key, []
+                ids.append(list_id)
+            if current is not None:
+                offsets.append(position)
+                data.write(current + b"\x00" + b",".join(ids) + b"\n")
+    finally:
+        for f in files:
+            f.close()
+
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    tmp = index_path.with_name(index_path.name + ".tmp")
+    with open(tmp, "wb") as out, open(data_tmp, "rb") as data:
+        out.write(HEADER.pack(MAGIC, len(offsets)))
+        out.write(offsets.tobytes())
+        shutil.copyfileobj(data, out, 1 << 20)
+    os.replace(tmp, index_path)
+    data_tmp.unlink()
+    return len(offsets)
+
+
+def _tagged(f, list_id):
+    for line in f:
+        yield line[:-1], list_id
+
+
+class HostIndex:
+    """Read-only view of a built index file opened with mmap."""
+
+    def __init__(self, index_dir=INDEX_DIR):
+        index_dir = Path(index_dir)
+        manifest = _load_manifest(index_dir)
+        self.list_names = {e["id"]: e["name"] for e in manifest["lists"].values()}
+        self._file = open(index_dir / INDEX_FILE, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"Not a Moonstone host index: {index_dir / INDEX_FILE}")
+        self._offsets_at = HEADER.size
+        self._data_at = HEADER.size + OFFSET.size * self.count
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _record(self, i):
+        start = self._data_at + OFFSET.unpack_from(self._mm, self._offsets_at + OFFSET.size * i)[0]
+        end = self._mm.find(b"\n", start)
+        key, _, ids = self._mm[start:end].partition(b"\x00")
+        return key, ids
+
+    def find(self, key):
+        """Binary search for an exact key. Returns the list ids or None."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key, ids = self._record(mid)
+            if mid_key == key:
+                return [int(i) for i in ids.split(b",")]
+            if mid_key < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def lookup(self, domain):
+        """Return [(entry, list file name)] for the domain and its parent domains."""
+        matches = []
+        for key in suffix_keys(domain):
+            ids = self.find(key)
+            if ids:
+                entry = ".".join(reversed(key.decode("utf-8").split(".")))
+                matches.extend((entry, self.list_names.get(i, f"#{i}")) for i in ids)
+        return matches
+
+
+def check_domain(domain, bat_files, index_dir=INDEX_DIR, coverage=None):
+    """Return the hostlist entries covering a domain and the profile sections using them."""
+    if coverage is None:
+        coverage = profile_coverage(bat_files)
+    with HostIndex(index_dir) as index:
+        matches = index.lookup(domain)
+    return {
+        "domain": domain,
+        "matches": [
+            {"entry": entry, "list": name, "sections": coverage.get(name, [])}
+            for entry, name in matches
+        ],
+    }
+
+
+def format_result(result):
+    """Return a human readable multi-line description of check_domain() output."""
+    if not result["matches"]:
+        return f"{result['domain']}: не найден ни в одном списке"
+    lines = []
+    for match in result["matches"]:
+        lines.append(f"{result['domain']}: {match['entry']} в {match['list']}")
+        for profile, index, filters in match["sections"]:
+            lines.append(f"  {profile} #{index} {filters}".rstrip())
+        if not match["sections"]:
+            lines.append("  не используется ни одним профилем")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(prog="python -m src.hostindex", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="build or update the index")
+    p_build.add_argument("--force", action="store_true", help="re-read every list")
+    p_check = sub.add_parser("check", help="show which lists and profiles cover domains")
+    p_check.add_argument("domains", nargs="+")
+    args = parser.parse_args(argv)
+
+    bat_files = sorted(BAT_DIR.glob("*.bat"))
+    summary = build_index(force=getattr(args, "force", False))
+    if args.command == "build":
+        print(f"{summary['domains']} domains from {summary['lists']} lists, "
+              f"re-read: {', '.join(summary['changed']) or 'none'}")
+        return 0
+    coverage = profile_coverage(bat_files)
+    for domain in args.domains:
+        print(format_result(check_domain(domain, bat_files, coverage=coverage)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,9 @@
 """Main entry point for Moonstone application."""
+import time
+
+# Taken before the heavy imports so the logon timing covers them
+PROCESS_STARTED = time.perf_counter()
+
 import sys
 import logging
 from pathlib import Path
@@ -17,10 +22,10 @@ if __name__ == "__main__":
     except:
         pass
     # Use absolute imports
-    from src import admin, ui, config
+    from src import admin, config, service, state
 else:
     # Running as module - use relative imports
-    from . import admin, ui, config
+    from . import admin, config, service, state
 
 # Настройка логирования
 logging.basicConfig(
@@ -31,23 +36,70 @@ logging.basicConfig(
     encoding='utf-8'
 )
 
+# Command line flag passed by the autostart task
+LOGON_FLAG = "--logon"
+
+
+def restore_last_profile(bat_files, started=PROCESS_STARTED):
+    """Start the last used profile before any UI is built.
+
+    Returns True if the service reached RUNNING.
+    """
+    app_state = state.load_state()
+    if not app_state["last_bat"] or app_state["stopped"]:
+        logging.info("Нет профиля для восстановления при входе в систему")
+        return False
+    bat = next((b for b in bat_files if b.stem == app_state["last_bat"]), None)
+    if bat is None:
+        logging.error(f"Профиль для восстановления не найден: {app_state['last_bat']}")
+        return False
+    logging.info(f"Восстановление профиля при входе в систему: {bat.stem}")
+    try:
+        service.ensure_service(bat, bat.stem)
+    except SystemExit as e:  # service helpers exit on fatal errors
+        logging.error(f"Не удалось восстановить профиль {bat.stem}: {e}")
+        return False
+    # Counts the activation and starts the uptime session in the profile history
+    state.save_state(last_bat=bat.stem, stopped=False)
+    running = service.wait_for_state("RUNNING", config.LOGON_START_TIMEOUT)
+    if running:
+        logging.info(f"Время от запуска процесса до RUNNING: {time.perf_counter() - started:.3f} с")
+    return running
+
 
 def main():
     """Main entry point."""
     logging.info("Начало выполнения скрипта")
-    
-    # Check for admin privileges
-    if not admin.is_admin():
-        logging.info("Требуются права администратора, перезапуск...")
-        admin.run_as_admin()
-    
+    logon = LOGON_FLAG in sys.argv[1:]
+    elevated = admin.is_admin()
+
+    if logon:
+        logging.info("Запуск в режиме входа в систему")
+    if not elevated:
+        if logon:
+            # The autostart task should run with highest privileges; no UAC prompt at logon
+            logging.error("Запуск при входе без прав администратора, восстановление профиля пропущено")
+        else:
+            logging.info("Требуются права администратора, перезапуск...")
+            admin.run_as_admin()
+
     logging.info("Вызов функции main()")
-    
+
     # Get batch files
     bat_files = list(config.BAT_DIR.glob("*.bat"))
-    
+
+    # Bring the bypass up first, the tray is built afterwards
+    if logon and elevated:
+        restore_last_profile(bat_files)
+
+    # Imported here so the logon path does not wait for PyQt5
+    if __name__ == "__main__":
+        from src import ui
+    else:
+        from . import ui
+
     # Create and run tray application
-    sys.exit(ui.create_tray_app(bat_files))
+    sys.exit(ui.create_tray_app(bat_files, restore_last=not logon))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,229 @@
+"""Resource monitoring of the running winws.exe service process."""
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+import psutil
+
+# Handle both relative and absolute imports
+try:
+    from .config import (
+        MONITOR_INTERVAL,
+        MONITOR_HISTORY,
+        MONITOR_ALERT_SAMPLES,
+        MONITOR_THRESHOLDS,
+        MONITOR_LOOKUP_BACKOFF_MAX,
+    )
+    from . import service
+except ImportError:
+    from src.config import (
+        MONITOR_INTERVAL,
+        MONITOR_HISTORY,
+        MONITOR_ALERT_SAMPLES,
+        MONITOR_THRESHOLDS,
+        MONITOR_LOOKUP_BACKOFF_MAX,
+    )
+    from src import service
+
+METRICS = ("cpu_percent", "rss", "handles", "threads", "read_bytes", "write_bytes")
+
+
+def find_service_process():
+    """Return a psutil.Process for the running service, or None."""
+    pid = service.get_service_pid()
+    if pid is None:
+        return None
+    try:
+        return psutil.Process(pid)
+    except psutil.Error as e:
+        logging.error(f"Не удалось открыть процесс службы (PID {pid}): {e}")
+        return None
+
+
+def read_sample(proc):
+    """Read one sample of resource usage from a psutil.Process."""
+    with proc.oneshot():
+        sample = {
+            "time": time.time(),
+            "cpu_percent": proc.cpu_percent(None),
+            "rss": proc.memory_info().rss,
+            # Handles exist only on Windows, open file descriptors are the closest elsewhere
+            "handles": proc.num_handles() if hasattr(proc, "num_handles") else proc.num_fds(),
+            "threads": proc.num_threads(),
+            "read_bytes": None,
+            "write_bytes": None,
+        }
+        try:
+            io = proc.io_counters()
+            sample["read_bytes"] = io.read_bytes
+            sample["write_bytes"] = io.write_bytes
+        except (psutil.AccessDenied, AttributeError):
+            pass
+    return sample
+
+
+def summarize(samples):
+    """Return mean/max per metric over a list of samples."""
+    summary = {"samples": len(samples)}
+    for metric in METRICS:
+        values = [s[metric] for s in samples if s.get(metric) is not None]
+        if values:
+            summary[metric] = {"mean": sum(values) / len(values), "max": max(values)}
+    return summary
+
+
+def format_sample(sample):
+    """Return a short one-line description of a sample for the tray tooltip."""
+    return (f"CPU {sample['cpu_percent']:.1f}% · RAM {sample['rss'] / (1024 * 1024):.1f} MB · "
+            f"handles {sample['handles']} · threads {sample['threads']}")
+
+
+class ResourceMonitor:
+    """Background sampler of CPU, memory, handles, threads and I/O of winws.exe.
+
+    find_process: callable returning a psutil.Process or None (the service by default).
+    on_alert: callable(metric, value, limit) called once when a metric stays above
+              its threshold for `alert_samples` consecutive samples.
+    clock: monotonic time source for the process lookup back-off.
+
+    No lookup is done while no profile is active; after a failed lookup the next
+    one waits twice as long, up to `backoff_max` seconds.
+    """
+
+    def __init__(self, find_process=find_service_process, interval=MONITOR_INTERVAL,
+                 history=MONITOR_HISTORY, thresholds=None,
+                 alert_samples=MONITOR_ALERT_SAMPLES, on_alert=None,
+                 backoff_max=MONITOR_LOOKUP_BACKOFF_MAX, clock=time.monotonic):
+        self.find_process = find_process
+        self.interval = interval
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self.thresholds = dict(MONITOR_THRESHOLDS if thresholds is None else thresholds)
+        self.alert_samples = alert_samples
+        self.on_alert = on_alert
+        self.profile = None
+        self._history = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._proc = None
+        self._over = {}
+        self._alerted = set()
+        self._lookup_delay = 0.0
+        self._lookup_at = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the sampler thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ResourceMonitor", daemon=True)
+        self._thread.start()
+        logging.info(f"Мониторинг ресурсов запущен, интервал {self.interval} с")
+
+    def stop(self):
+        """Stop the sampler thread."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+        logging.info("Мониторинг ресурсов остановлен")
+
+    def set_profile(self, profile):
+        """Tag further samples with the active profile name (None when stopped)."""
+        with self._lock:
+            self.profile = profile
+            self._proc = None
+            self._over.clear()
+            self._alerted.clear()
+            self._lookup_delay = 0.0
+            self._lookup_at = 0.0
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception as e:  # noqa: BLE001
+                logging.error(f"Ошибка мониторинга ресурсов: {e}")
+            self._stop.wait(self.interval)
+
+    def sample(self):
+        """Take one sample, store it and check thresholds. Returns the sample or None."""
+        proc = self._proc
+        if proc is None or not proc.is_running():
+            self._proc = None
+            if self.profile is None or self.clock() < self._lookup_at:
+                return None
+            proc = self.find_process()
+            if proc is None:
+                self._lookup_delay = min(max(self._lookup_delay * 2, self.interval), self.backoff_max)
+                self._lookup_at = self.clock() + self._lookup_delay
+                return None
+            self._lookup_delay = 0.0
+            # First cpu_percent() call only sets the reference point
+            proc.cpu_percent(None)
+            self._proc = proc
+            logging.info(f"Мониторинг процесса службы, PID {proc.pid}")
+        try:
+            sample = read_sample(proc)
+        except psutil.NoSuchProcess:
+            self._proc = None
+            return None
+        sample["pid"] = proc.pid
+        sample["profile"] = self.profile
+        with self._lock:
+            self._history.append(sample)
+        self._check_thresholds(sample)
+        return sample
+
+    def _check_thresholds(self, sample):
+        for metric, limit in self.thresholds.items():
+            value = sample.get(metric)
+            if value is None or value <= limit:
+                self._over[metric] = 0
+                self._alerted.discard(metric)
+                continue
+            self._over[metric] = self._over.get(metric, 0) + 1
+            if self._over[metric] >= self.alert_samples and metric not in self._alerted:
+                self._alerted.add(metric)
+                logging.warning(f"Превышен порог {metric}: {value} > {limit}")
+                if self.on_alert:
+                    self.on_alert(metric, value, limit)
+
+    def latest(self):
+        """Return the most recent sample or None."""
+        with self._lock:
+            return self._history[-1] if self._history else None
+
+    def current(self):
+        """Return the latest sample while the service process is alive, else None."""
+        return self.latest() if self._proc is not None else None
+
+    def history(self):
+        """Return a copy of the stored samples, oldest first."""
+        with self._lock:
+            return list(self._history)
+
+    def export_history(self, path):
+        """Write the stored samples and a per-profile summary to a JSON file."""
+        samples = self.history()
+        data = {
+            "exported": datetime.now().isoformat(timespec="seconds"),
+            "profile": self.profile,
+            "interval": self.interval,
+            "thresholds": self.thresholds,
+            "summary": {
+                str(profile): summarize([s for s in samples if s["profile"] == profile])
+                for profile in dict.fromkeys(s["profile"] for s in samples)
+            },
+            "samples": samples,
+        }
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        logging.info(f"История ресурсов сохранена: {path} ({len(samples)} записей)")
+        return path
@@ -0,0 +1,712 @@
+"""Offline replay of packet traces through a model of a profile's --new sections.
+
+Reads a pcap/pcapng file or a CSV of connections, runs every flow through the
+profile's sections the way winws.exe selects them (L4 filter, --filter-l7,
+hostlist suffix matching, first match wins), reports hits per section and per
+hostlist entry and suggests a section order with fewer evaluation steps.
+
+Usage:
+    python -m src.replay analyze TRACE PROFILE.bat [--write OUT.bat] [--json REPORT.json]
+    python -m src.replay generate OUT.csv|OUT.pcap [--flows N] [--seed N] [--hostlist FILE]
+
+CSV columns: proto (tcp/udp), port, host (or sni), optional l7 and count.
+QUIC Initial packets are encrypted, so UDP 443 flows from pcap files have no host;
+use a CSV with SNI to model QUIC hostlist sections.
+"""
+import argparse
+import csv
+import json
+import logging
+import random
+import re
+import struct
+import sys
+from collections import Counter
+from pathlib import Path, PureWindowsPath
+
+# Handle both relative and absolute imports
+try:
+    from .config import ENCODING
+    from . import service
+except ImportError:
+    from src.config import ENCODING
+    from src import service
+
+TCP, UDP = "tcp", "udp"
+HTTP_METHODS = (b"GET ", b"POST ", b"HEAD ", b"PUT ", b"OPTIONS ", b"DELETE ", b"PATCH ", b"CONNECT ")
+STUN_COOKIE = b"\x21\x12\xa4\x42"
+DISCORD_PREFIX = b"\x00\x01\x00\x46"
+
+
+# --------------------------------------------------------------------------
+# Profile model
+# --------------------------------------------------------------------------
+
+def _option(token):
+    """Split `--name=value` into (name, value without quotes)."""
+    name, _, value = token.partition("=")
+    return name, value.strip('"')
+
+
+def _parse_ports(spec):
+    """Parse a winws port list like `80,443,50000-50100` into (lo, hi) ranges."""
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if part == "*":
+            ranges.append((0, 65535))
+        elif "-" in part:
+            lo, hi = part.split("-", 1)
+            ranges.append((int(lo), int(hi)))
+        else:
+            ranges.append((int(part), int(part)))
+    return ranges
+
+
+def normalize_domain(line):
+    """Return the hostlist entry of a line (lowercase, no `*.`), or None for blanks/comments."""
+    entry = line.strip().lower()
+    if not entry or entry.startswith("#"):
+        return None
+    while entry.startswith(("*", ".")):
+        entry = entry[1:]
+    return entry or None
+
+
+def load_hostlist(path, cache=None):
+    """Read a hostlist file into a set of entries (cached by path)."""
+    if cache is not None and path in cache:
+        return cache[path]
+    entries = set()
+    try:
+        with open(path, "r", encoding=ENCODING, errors="ignore") as f:
+            for line in f:
+                entry = normalize_domain(line)
+                if entry:
+                    entries.add(entry)
+    except OSError as e:
+        logging.error(f"Не удалось прочитать список хостов {path}: {e}")
+    if cache is not None:
+        cache[path] = entries
+    return entries
+
+
+def parse_section(index, tokens, hostlist_cache=None):
+    """Build the matching model of one --new section."""
+    section = {
+        "index": index,
+        "tokens": tokens,
+        "tcp": None,
+        "udp": None,
+        "l7": None,
+        "hostlists": [],
+        "include": None,
+        "exclude": None,
+    }
+    for token in tokens:
+        name, value = _option(token)
+        if name == "--filter-tcp":
+            section["tcp"] = _parse_ports(value)
+        elif name == "--filter-udp":
+            section["udp"] = _parse_ports(value)
+        elif name == "--filter-l7":
+            section["l7"] = set(value.split(","))
+        elif name in ("--hostlist", "--hostlist-domains"):
+            if name == "--hostlist":
+                source = PureWindowsPath(value).name
+                domains = load_hostlist(Path(value), hostlist_cache)
+            else:
+                source = "--hostlist-domains"
+                domains = {d for d in map(normalize_domain, value.split(",")) if d}
+            section["hostlists"].append(source)
+            section["include"] = section["include"] or {}
+            for domain in domains:
+                section["include"].setdefault(domain, source)
+        elif name in ("--hostlist-exclude", "--hostlist-exclude-domains"):
+            if name == "--hostlist-exclude":
+                domains = load_hostlist(Path(value), hostlist_cache)
+            else:
+                domains = {d for d in map(normalize_domain, value.split(",")) if d}
+            section["exclude"] = (section["exclude"] or set()) | domains
+    return section
+
+
+def load_profile(batch_path):
+    """Return (global options, section models) of a profile via parse_bat_file."""
+    _, args = service.parse_bat_file(batch_path)
+    global_opts, sections = service.split_sections(args)
+    cache = {}
+    return global_opts, [parse_section(i, tokens, cache) for i, tokens in enumerate(sections)]
+
+
+def section_label(section):
+    """Short human readable description of a section's filters."""
+    parts = []
+    for proto in (TCP, UDP):
+        if section[proto] is not None:
+            ports = ",".join(f"{lo}" if lo == hi else f"{lo}-{hi}" for lo, hi in section[proto])
+            parts.append(f"{proto}:{ports}")
+    if section["l7"]:
+        parts.append("l7:" + ",".join(sorted(section["l7"])))
+    if section["hostlists"]:
+        parts.append("hostlist:" + ",".join(section["hostlists"]))
+    return " ".join(parts) or "any"
+
+
+# --------------------------------------------------------------------------
+# Matching
+# --------------------------------------------------------------------------
+
+def match_suffix(host, domains):
+    """Find the hostlist entry covering host or one of its parent domains.
+
+    Returns (entry or None, number of lookups).
+    """
+    probes = 0
+    while True:
+        probes += 1
+        if host in domains:
+            return host, probes
+        dot = host.find(".")
+        if dot < 0:
+            return None, probes
+        host = host[dot + 1:]
+
+
+def _port_match(ranges, port):
+    return any(lo <= port <= hi for lo, hi in ranges)
+
+
+def match_section(section, flow):
+    """Check one section against a flow. Returns (matched, steps, hostlist entry)."""
+    proto, port = flow["proto"], flow["port"]
+    if section["tcp"] is not None or section["udp"] is not None:
+        ranges = section[proto]
+        if ranges is None or not _port_match(ranges, port):
+            return False, 1, None
+    if section["l7"] is not None and flow.get("l7") not in section["l7"]:
+        return False, 1, None
+    steps = 1
+    host = flow.get("host")
+    if section["exclude"] is not None and host:
+        entry, probes = match_suffix(host, section["exclude"])
+        steps += probes
+        if entry:
+            return False, steps, None
+    if section["include"] is not None:
+        if not host:
+            return False, steps, None
+        entry, probes = match_suffix(host, section["include"])
+        steps += probes
+        if entry is None:
+            return False, steps, None
+        return True, steps, entry
+    return True, steps, None
+
+
+def replay(sections, flows):
+    """Run flows through sections in the given order and collect statistics."""
+    section_hits = Counter()
+    entry_hits = Counter()
+    section_cost = Counter()  # steps spent inside each section
+    section_evaluated = Counter()  # flows that evaluated each section
+    total_flows = total_steps = unmatched = 0
+    for flow in flows:
+        count = flow.get("count", 1)
+        total_flows += count
+        for section in sections:
+            matched, steps, entry = match_section(section, flow)
+            section_evaluated[section["index"]] += count
+            section_cost[section["index"]] += steps * count
+            total_steps += steps * count
+            if matched:
+                section_hits[section["index"]] += count
+                if entry:
+                    source = section["include"][entry]
+                    entry_hits[f"{source}:{entry}"] += count
+                break
+        else:
+            unmatched += count
+    return {
+        "flows": total_flows,
+        "unmatched": unmatched,
+        "steps": total_steps,
+        "avg_steps": total_steps / total_flows if total_flows else 0.0,
+        "order": [s["index"] for s in sections],
+        "section_hits": dict(section_hits),
+        "section_cost": dict(section_cost),
+        "section_evaluated": dict(section_evaluated),
+        "entry_hits": dict(entry_hits),
+    }
+
+
+# --------------------------------------------------------------------------
+# Reordering
+# --------------------------------------------------------------------------
+
+def _ranges_overlap(a, b):
+    return any(alo <= bhi and blo <= ahi for alo, ahi in a for blo, bhi in b)
+
+
+def sections_overlap(a, b):
+    """Whether some flow could match both sections (then their order matters)."""
+    any_a = a["tcp"] is None and a["udp"] is None
+    any_b = b["tcp"] is None and b["udp"] is None
+    if not (any_a or any_b):
+        if not any(a[p] is not None and b[p] is not None and _ranges_overlap(a[p], b[p])
+                   for p in (TCP, UDP)):
+            return False
+    if a["l7"] is not None and b["l7"] is not None and not (a["l7"] & b["l7"]):
+        return False
+    # Hostlists are treated as overlapping: suffix matching makes disjointness costly to prove
+    return True
+
+
+def suggest_order(sections, stats):
+    """Suggest a section order that minimizes average evaluation steps.
+
+    Sections that can match the same flow keep their relative order, so the
+    chosen strategy of every flow stays the same. Among the rest, sections are
+    placed greedily by cost per hit (Smith's rule): cheap, frequently hit first.
+    """
+    hits = stats["section_hits"]
+    cost = {
+        i: stats["section_cost"].get(i, 0) / stats["section_evaluated"][i]
+        if stats["section_evaluated"].get(i) else 1.0
+        for i in (s["index"] for s in sections)
+    }
+    predecessors = {
+        s["index"]: {p["index"] for p in sections[:pos] if sections_overlap(p, s)}
+        for pos, s in enumerate(sections)
+    }
+    by_index = {s["index"]: s for s in sections}
+    placed, order = set(), []
+    while len(order) < len(sections):
+        ready = [i for i in by_index if i not in placed and predecessors[i] <= placed]
+        best = min(ready, key=lambda i: (cost[i] / hits[i] if hits.get(i) else float("inf"), i))
+        placed.add(best)
+        order.append(by_index[best])
+    return order
+
+
+def write_profile(batch_path, order, out_path):
+    """Write a copy of a .bat profile with its --new sections in `order` (original indexes)."""
+    with open(batch_path, "r", encoding=ENCODING) as f:
+        content = f.read()
+    match = re.search(r'(start\s+"[^"]*"\s+/min\s+"[^"]+")\s+(.+)', content, re.DOTALL)
+    if not match:
+        raise ValueError(f"Could not parse winws.exe command from {batch_path}")
+    raw_args = match.group(2).strip().replace('^', '').replace('\n', ' ').strip()
+    global_opts, sections = service.split_sections(raw_args)
+    if sorted(order) != list(range(len(sections))):
+        raise ValueError(f"Order {order} does not match {len(sections)} sections")
+    newline = "\r\n" if "\r\n" in content else "\n"
+    lines = [" ".join([match.group(1), *global_opts, "^"])]
+    for n, index in enumerate(order):
+        tail = " --new ^" if n < len(order) - 1 else ""
+        lines.append(" ".join(sections[index]) + tail)
+    with open(out_path, "w", encoding=ENCODING, newline="") as f:
+        f.write(content[:match.start()] + newline.join(lines) + newline)
+    logging.info(f"Записан профиль с новым порядком секций {order}: {out_path}")
+    return out_path
+
+
+# --------------------------------------------------------------------------
+# Trace readers
+# --------------------------------------------------------------------------
+
+def read_csv(path):
+    """Read flows from a CSV file with proto, port, host/sni and optional l7, count."""
+    flows = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            row = {k.strip().lower(): (v or "").strip() for k, v in row.items() if k}
+            host = row.get("host") or row.get("sni") or None
+            flows.append({
+                "proto": row["proto"].lower(),
+                "port": int(row.get("port") or row.get("dst_port")),
+                "host": host.lower().rstrip(".") if host else None,
+                "l7": row.get("l7") or None,
+                "count": int(row.get("count") or 1),
+            })
+    return flows
+
+
+def extract_sni(payload):
+    """Return the SNI of a TLS ClientHello, or None."""
+    try:
+        if len(payload) < 44 or payload[0] != 0x16 or payload[5] != 0x01:
+            return None
+        pos = 9 + 2 + 32  # record + handshake headers, version, random
+        pos += 1 + payload[pos]  # session id
+        pos += 2 + struct.unpack_from("!H", payload, pos)[0]  # cipher suites
+        pos += 1 + payload[pos]  # compression methods
+        end = pos + 2 + struct.unpack_from("!H", payload, pos)[0]
+        pos += 2
+        while pos + 4 <= min(end, len(payload)):
+            ext_type, ext_len = struct.unpack_from("!HH", payload, pos)
+            pos += 4
+            if ext_type == 0:
+                name_len = struct.unpack_from("!H", payload, pos + 3)[0]
+                return payload[pos + 5:pos + 5 + name_len].decode("ascii").lower()
+            pos += ext_len
+    except (IndexError, struct.error, UnicodeDecodeError):
+        pass
+    return None
+
+
+def extract_http_host(payload):
+    """Return the Host header of an HTTP request, or None."""
+    if not payload.startswith(HTTP_METHODS):
+        return None
+    match = re.search(rb"\r\nhost:[ \t]*([^\r\n:]+)", payload, re.IGNORECASE)
+    return match.group(1).decode("ascii", "ignore").strip().lower() if match else None
+
+
+def detect_l7(proto, port, payload):
+    """Guess the winws --filter-l7 protocol of a flow's first payload."""
+    if proto == TCP:
+        if payload[:1] == b"\x16" and payload[1:2] == b"\x03":
+            return "tls"
+        if payload.startswith(HTTP_METHODS):
+            return "http"
+    else:
+        if len(payload) == 74 and payload[:4] == DISCORD_PREFIX:
+            return "discord"
+        if len(payload) >= 20 and payload[4:8] == STUN_COOKIE:
+            return "stun"
+        if port == 443 and payload[:1] and payload[0] & 0xC0 == 0xC0:
+            return "quic"
+    return "unknown" if payload else None
+
+
+def _ip_packet(linktype, data):
+    """Strip the link layer header. Returns the IP packet or None."""
+    if linktype == 1:  # Ethernet
+        ethertype, offset = struct.unpack_from("!H", data, 12)[0], 14
+        while ethertype in (0x8100, 0x88A8):  # VLAN tags
+            ethertype, offset = struct.unpack_from("!H", data, offset + 2)[0], offset + 4
+        return data[offset:] if ethertype in (0x0800, 0x86DD) else None
+    if linktype == 0:  # BSD loopback / Npcap loopback
+        return data[4:]
+    if linktype == 113:  # Linux cooked capture
+        return data[16:]
+    if linktype == 276:  # Linux cooked capture v2
+        return data[20:]
+    if linktype in (12, 14, 101, 228, 229):  # Raw IP
+        return data
+    return None
+
+
+def _transport(ip):
+    """Return (proto, src, sport, dst, dport, tcp_flags, payload) of an IP packet, or None."""
+    version = ip[0] >> 4
+    if version == 4:
+        header = (ip[0] & 0x0F) * 4
+        proto_num = ip[9]
+        src, dst = ip[12:16], ip[16:20]
+        total = struct.unpack_from("!H", ip, 2)[0] or len(ip)
+        body = ip[header:total]
+    elif version == 6:
+        proto_num = ip[6]
+        src, dst = ip[8:24], ip[24:40]
+        body = ip[40:40 + struct.unpack_from("!H", ip, 4)[0]]
+    else:
+        return None
+    if proto_num == 6 and len(body) >= 20:
+        sport, dport = struct.unpack_from("!HH", body)
+        offset = (body[12] >> 4) * 4
+        return TCP, src, sport, dst, dport, body[13], bytes(body[offset:])
+    if proto_num == 17 and len(body) >= 8:
+        sport, dport = struct.unpack_from("!HH", body)
+        return UDP, src, sport, dst, dport, 0, bytes(body[8:])
+    return None
+
+
+def _pcap_packets(f):
+    """Yield (linktype, frame) from a classic pcap file object."""
+    header = f.read(24)
+    magic = header[:4]
+    if magic in (b"\xd4\xc3\xb2\xa1", b"\x4d\x3c\xb2\xa1"):
+        endian = "<"
+    elif magic in (b"\xa1\xb2\xc3\xd4", b"\xa1\xb2\x3c\x4d"):
+        endian = ">"
+    else:
+        raise ValueError("Not a pcap file")
+    linktype = struct.unpack(endian + "I", header[20:24])[0] & 0xFFFF
+    while True:
+        record = f.read(16)
+        if len(record) < 16:
+            return
+        incl_len = struct.unpack(endian + "I", record[8:12])[0]
+        yield linktype, f.read(incl_len)
+
+
+def _pcapng_packets(f):
+    """Yield (linktype, frame) from a pcapng file object."""
+    endian = "<"
+    linktypes = []
+    while True:
+        head = f.read(8)
+        if len(head) < 8:
+            return
+        block_type = struct.unpack(endian + "I", head[:4])[0]
+        if head[:4] == b"\x0a\x0d\x0d\x0a":  # Section Header Block
+            bom = f.read(4)
+            endian = "<" if bom == b"\x4d\x3c\x2b\x1a" else ">"
+            length = struct.unpack(endian + "I", head[4:8])[0]
+            f.read(length - 12)
+            linktypes = []
+            continue
+        length = struct.unpack(endian + "I", head[4:8])[0]
+        body = f.read(length - 8) if length >= 12 else b""
+        if len(body) < length - 8 or length < 12:
+            logging.warning("Обрезанный или повреждённый блок pcapng, чтение остановлено")
+            return
+        try:
+            if block_type == 1:  # Interface Description Block
+                linktypes.append(struct.unpack(endian + "H", body[:2])[0])
+            elif block_type == 6:  # Enhanced Packet Block
+                interface, _, _, cap_len = struct.unpack(endian + "IIII", body[:16])
+                if interface < len(linktypes):  # else no Interface Description Block
+                    yield linktypes[interface], body[20:20 + cap_len]
+            elif block_type == 3 and linktypes:  # Simple Packet Block
+                orig_len = struct.unpack(endian + "I", body[:4])[0]
+                yield linktypes[0], body[4:4 + orig_len]
+        except struct.error:
+            continue  # block body shorter than its fixed fields
+
+
+def read_pcap(path):
+    """Read client flows (first payload: host and l7) from a pcap or pcapng file."""
+    flows = {}
+    with open(path, "rb") as f:
+        magic = f.read(4)
+        f.seek(0)
+        packets = _pcapng_packets(f) if magic == b"\x0a\x0d\x0d\x0a" else _pcap_packets(f)
+        for linktype, frame in packets:
+            try:
+                ip = _ip_packet(linktype, frame)
+                parsed = _transport(ip) if ip else None
+            except (IndexError, struct.error):
+                continue
+            if not parsed:
+                continue
+            proto, src, sport, dst, dport, flags, payload = parsed
+            key = (proto, src, sport, dst, dport)
+            reverse = (proto, dst, dport, src, sport)
+            if reverse in flows:
+                continue  # server to client
+            if key not in flows:
+                if proto == TCP and flags & 0x12 == 0x12:
+                    # SYN-ACK of a connection whose SYN was not captured
+                    flows[reverse] = {"proto": proto, "port": sport, "host": None, "l7": None}
+                    continue
+                flows[key] = {"proto": proto, "port": dport, "host": None, "l7": None}
+            flow = flows[key]
+            if payload and flow["l7"] is None:
+                flow["l7"] = detect_l7(proto, dport, payload)
+                if proto == TCP:
+                    flow["host"] = extract_sni(payload) or extract_http_host(payload)
+    return _aggregate(flows.values())
+
+
+def _aggregate(flows):
+    """Merge identical flows into one entry with a count."""
+    counts = Counter()
+    for f in flows:
+        counts[(f["proto"], f["port"], f["host"], f["l7"])] += f.get("count", 1)
+    return [
+        {"proto": proto, "port": port, "host": host, "l7": l7, "count": count}
+        for (proto, port, host, l7), count in counts.items()
+    ]
+
+
+def read_trace(path):
+    """Read flows from a .csv file or a pcap/pcapng capture."""
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        return _aggregate(read_csv(path))
+    return read_pcap(path)
+
+
+# --------------------------------------------------------------------------
+# Synthetic traces
+# --------------------------------------------------------------------------
+
+# (weight, proto, port, l7, host from hostlist probability)
+TRAFFIC_MIX = [
+    (70, TCP, 443, "tls", 0.6),
+    (12, UDP, 443, "quic", 0.6),
+    (6, TCP, 80, "http", 0.4),
+    (5, UDP, 50010, "discord", 0.0),
+    (2, UDP, 50020, "stun", 0.0),
+    (5, TCP, 8080, "unknown", 0.0),
+]
+
+
+def generate_flows(count, domains, seed=0, mix=TRAFFIC_MIX):
+    """Generate `count` synthetic flows, part of them to hosts from `domains`."""
+    rng = random.Random(seed)
+    domains = sorted(domains)
+    weights = [m[0] for m in mix]
+    flows = []
+    for i in range(count):
+        _, proto, port, l7, listed = rng.choices(mix, weights)[0]
+        if l7 in ("discord", "stun", "unknown"):
+            host = None
+        elif domains and rng.random() < listed:
+            host = rng.choice(domains)
+            if rng.random() < 0.5:
+                host = f"{rng.choice(['www', 'cdn', 'rr1', 'api'])}.{host}"
+        else:
+            host = f"site{rng.randrange(5000)}.example.org"
+        flows.append({"proto": proto, "port": port, "host": host, "l7": l7, "count": 1})
+    return flows
+
+
+def write_csv(path, flows):
+    """Write flows as a CSV trace."""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["proto", "port", "host", "l7", "count"])
+        writer.writeheader()
+        for flow in flows:
+            writer.writerow({**flow, "host": flow["host"] or ""})
+    return path
+
+
+def _client_hello(host):
+    name = host.encode("ascii")
+    sni = struct.pack("!HBH", len(name) + 3, 0, len(name)) + name
+    extensions = struct.pack("!HH", 0, len(sni)) + sni
+    body = (b"\x03\x03" + bytes(32) + b"\x00" + b"\x00\x02\x13\x01" + b"\x01\x00"
+            + struct.pack("!H", len(extensions)) + extensions)
+    handshake = b"\x01" + struct.pack("!I", len(body))[1:] + body
+    return b"\x16\x03\x01" + struct.pack("!H", len(handshake)) + handshake
+
+
+def _payload(flow, rng):
+    l7, host = flow["l7"], flow["host"]
+    if l7 == "tls":
+        return _client_hello(host)
+    if l7 == "http":
+        return f"GET / HTTP/1.1\r\nHost: {host}\r\nUser-Agent: replay\r\n\r\n".encode("ascii")
+    if l7 == "quic":
+        return b"\xc3" + rng.randbytes(1199)
+    if l7 == "discord":
+        return DISCORD_PREFIX + rng.randbytes(70)
+    if l7 == "stun":
+        return b"\x00\x01\x00\x00" + STUN_COOKIE + rng.randbytes(12)
+    return rng.randbytes(64)
+
+
+def _frame(proto, src, sport, dst, dport, payload, flags=0x18):
+    if proto == TCP:
+        l4 = struct.pack("!HHIIBBHHH", sport, dport, 1, 0, 5 << 4, flags, 65535, 0, 0) + payload
+        proto_num = 6
+    else:
+        l4 = struct.pack("!HHHH", sport, dport, 8 + len(payload), 0) + payload
+        proto_num = 17
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(l4), 0, 0, 64, proto_num, 0, src, dst) + l4
+    return b"\x00\x11\x22\x33\x44\x55\x66\x77\x88\x99\xaa\xbb\x08\x00" + ip
+
+
+def write_pcap(path, flows, seed=0):
+    """Write flows as an Ethernet/IPv4 pcap (SYN + first payload for TCP)."""
+    rng = random.Random(seed)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        ts = 1_700_000_000
+        for n, flow in enumerate(flows):
+            for _ in range(flow.get("count", 1)):
+                src = bytes([10, 0, rng.randrange(256), rng.randrange(1, 255)])
+                dst = bytes([rng.randrange(1, 224), rng.randrange(256), rng.randrange(256), 1])
+                sport = 1024 + (n % 60000)
+                frames = []
+                if flow["proto"] == TCP:
+                    frames.append(_frame(TCP, src, sport, dst, flow["port"], b"", flags=0x02))
+                frames.append(_frame(flow["proto"], src, sport, dst, flow["port"], _payload(flow, rng)))
+                for frame in frames:
+                    f.write(struct.pack("<IIII", ts, n % 1000000, len(frame), len(frame)) + frame)
+                ts += 1
+    return path
+
+
+# --------------------------------------------------------------------------
+# Command line
+# --------------------------------------------------------------------------
+
+def analyze(trace_path, batch_path):
+    """Replay a trace through a profile. Returns (sections, current stats, order, suggested stats)."""
+    _, sections = load_profile(Path(batch_path))
+    flows = read_trace(trace_path)
+    current = replay(sections, flows)
+    order = suggest_order(sections, current)
+    suggested = replay(order, flows)
+    return sections, current, order, suggested
+
+
+def print_report(sections, current, suggested):
+    """Print hit counts and evaluation cost of the current and suggested order."""
+    total = current["flows"] or 1
+    print(f"Flows: {current['flows']}, unmatched: {current['unmatched']} "
+          f"({current['unmatched'] / total:.1%})\n")
+    print(f"{'#':>3} {'hits':>9} {'share':>7} {'steps/flow':>11}  section")
+    for section in sections:
+        i = section["index"]
+        hits = current["section_hits"].get(i, 0)
+        evaluated = current["section_evaluated"].get(i, 0)
+        cost = current["section_cost"].get(i, 0) / evaluated if evaluated else 0.0
+        print(f"{i:>3} {hits:>9} {hits / total:>7.1%} {cost:>11.2f}  {section_label(section)}")
+    print("\nTop hostlist entries:")
+    for entry, hits in Counter(current["entry_hits"]).most_common(15):
+        print(f"  {hits:>9}  {entry}")
+    print(f"\nAverage evaluation steps: {current['avg_steps']:.2f} (order {current['order']})")
+    print(f"Suggested order:          {suggested['avg_steps']:.2f} (order {suggested['order']})")
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(prog="python -m src.replay", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_analyze = sub.add_parser("analyze", help="replay a trace through a profile")
+    p_analyze.add_argument("trace", type=Path, help=".pcap, .pcapng or .csv")
+    p_analyze.add_argument("profile", type=Path, help="profile .bat file")
+    p_analyze.add_argument("--write", type=Path, help="write the reordered profile here")
+    p_analyze.add_argument("--json", type=Path, help="write the statistics as JSON")
+
+    p_generate = sub.add_parser("generate", help="write a synthetic trace")
+    p_generate.add_argument("output", type=Path, help=".csv or .pcap")
+    p_generate.add_argument("--flows", type=int, default=10000)
+    p_generate.add_argument("--seed", type=int, default=0)
+    p_generate.add_argument("--hostlist", type=Path, help="hostlist to draw listed hosts from")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        domains = load_hostlist(args.hostlist) if args.hostlist else set()
+        flows = generate_flows(args.flows, domains, seed=args.seed)
+        if args.output.suffix.lower() == ".csv":
+            write_csv(args.output, flows)
+        else:
+            write_pcap(args.output, flows, seed=args.seed)
+        print(f"Wrote {len(flows)} flows to {args.output}")
+        return 0
+
+    sections, current, order, suggested = analyze(args.trace, args.profile)
+    print_report(sections, current, suggested)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"current": current, "suggested": suggested}, f, indent=2)
+    if args.write:
+        write_profile(args.profile, [s["index"] for s in order], args.write)
+        print(f"\nReordered profile written to {args.write}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
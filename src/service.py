@@ -2,6 +2,7 @@
 import subprocess
 import re
 import sys
+import time
 import logging
 from pathlib import Path
 
@@ -11,6 +12,9 @@ try:
 except ImportError:
     from src.config import SERVICE_NAME, BAT_DIR, ENCODING
 
+# winws.exe options that apply to the whole process, not to a --new section
+GLOBAL_OPTION_PREFIXES = ("--wf-", "--debug", "--ipcache-", "--ctrack-", "--bind-fix")
+
 
 def run_cmd(cmd):
     """Execute a shell command and log the results."""
@@ -52,6 +56,16 @@ def get_service_display_name():
     return None
 
 
+def get_service_pid():
+    """Get the PID of the running service process, or None."""
+    result = run_cmd(f'sc.exe queryex "{SERVICE_NAME}"')
+    if result and result.returncode == 0:
+        match = re.search(r'PID\s*:\s*(\d+)', result.stdout)
+        if match and int(match.group(1)) != 0:
+            return int(match.group(1))
+    return None
+
+
 def parse_bat_file(batch_path):
     """Parse a batch file to extract executable and arguments."""
     logging.info(f"Чтение .bat файла: {batch_path}")
@@ -94,11 +108,33 @@ def parse_bat_file(batch_path):
     return executable, args
 
 
-def create_service(batch_path, display_version):
-    """Create a Windows service from a batch file."""
-    executable, args = parse_bat_file(batch_path)
-    service_display = f"Moonstone Zapret DPI Bypass version[{display_version}]"
-    
+def get_hostlist_paths(args):
+    """Return the --hostlist= file paths from parsed winws.exe arguments."""
+    paths = re.findall(r'--hostlist=(?:"([^"]+)"|(\S+))', args)
+    return list(dict.fromkeys(Path(quoted or bare) for quoted, bare in paths))
+
+
+def split_sections(args):
+    """Split winws.exe arguments into (global options, list of --new sections).
+
+    Options are kept as written, quotes included. Empty sections (e.g. from a
+    trailing --new) are dropped.
+    """
+    global_opts, sections, current = [], [], []
+    for token in re.findall(r'(?:[^\s"]+|"[^"]*")+', args):
+        if token == "--new":
+            sections.append(current)
+            current = []
+        elif token.startswith(GLOBAL_OPTION_PREFIXES):
+            global_opts.append(token)
+        else:
+            current.append(token)
+    sections.append(current)
+    return global_opts, [s for s in sections if s]
+
+
+def build_bin_path(executable, args):
+    """Build the sc.exe binPath value for winws.exe and its arguments."""
     # Properly quote the executable path if it contains spaces
     # For sc.exe binPath, the executable must be quoted if it has spaces
     if ' ' in str(executable):
@@ -108,7 +144,19 @@ def create_service(batch_path, display_version):
     
     # Construct the full binPath - the entire value needs to be quoted
     # and the executable within it should also be quoted if it has spaces
-    bin_path_value = f'{quoted_executable} {args}'
+    return f'{quoted_executable} {args}'
+
+
+def get_display_name(display_version):
+    """Return the service display name for a profile."""
+    return f"Moonstone Zapret DPI Bypass version[{display_version}]"
+
+
+def create_service(batch_path, display_version):
+    """Create a Windows service from a batch file."""
+    executable, args = parse_bat_file(batch_path)
+    service_display = get_display_name(display_version)
+    bin_path_value = build_bin_path(executable, args)
     
     # For sc.exe, use subprocess.run directly without shell to avoid quote interpretation issues
     # sc.exe expects parameters like "binPath= value" where value can contain spaces
@@ -154,6 +202,60 @@ def start_service(batch_path, display_version):
         logging.error(f"Не удалось запустить службу: {result.stderr}")
 
 
+def get_service_config():
+    """Return (display_name, binary_path) of the service, or None if it does not exist."""
+    result = run_cmd(f'sc.exe qc "{SERVICE_NAME}"')
+    if not result or result.returncode != 0:
+        return None
+    display = re.search(r'DISPLAY_NAME\s*:\s*(.+)', result.stdout)
+    binary = re.search(r'BINARY_PATH_NAME\s*:\s*(.+)', result.stdout)
+    return (display.group(1).strip() if display else None,
+            binary.group(1).strip() if binary else None)
+
+
+def get_service_state():
+    """Return the service state name (RUNNING, STOPPED, ...) or None if it does not exist."""
+    result = run_cmd(f'sc.exe query "{SERVICE_NAME}"')
+    if result and result.returncode == 0:
+        match = re.search(r'STATE\s*:\s*\d+\s+(\w+)', result.stdout)
+        if match:
+            return match.group(1)
+    return None
+
+
+def wait_for_state(expected, timeout, interval=0.1):
+    """Poll the service until it reaches `expected` state. Returns True on success."""
+    deadline = time.monotonic() + timeout
+    while True:
+        if get_service_state() == expected:
+            return True
+        if time.monotonic() >= deadline:
+            logging.error(f"Служба не перешла в состояние {expected} за {timeout} с")
+            return False
+        time.sleep(interval)
+
+
+def ensure_service(batch_path, display_version):
+    """Start the service for a profile, reusing an existing service of the same profile.
+
+    Unlike start_service(), a service that already has the same display name and
+    binPath (e.g. auto-started at boot) is only started if needed, not recreated.
+    """
+    existing = get_service_config()
+    if existing:
+        executable, args = parse_bat_file(batch_path)
+        if existing == (get_display_name(display_version), build_bin_path(executable, args)):
+            if get_service_state() != "RUNNING":
+                logging.info(f"Запуск существующей службы '{SERVICE_NAME}'...")
+                result = run_cmd(f'sc.exe start "{SERVICE_NAME}"')
+                if result and result.returncode != 0:
+                    logging.error(f"Не удалось запустить службу: {result.stderr}")
+            else:
+                logging.info(f"Служба '{SERVICE_NAME}' уже запущена с профилем {display_version}")
+            return
+    start_service(batch_path, display_version)
+
+
 def stop_service():
     """Stop the service."""
     if service_exists():
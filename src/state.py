@@ -1,34 +1,234 @@
 """State management functions."""
+import atexit
+import copy
 import json
 import logging
+import os
+import threading
+import time
+from datetime import datetime
 
 # Handle both relative and absolute imports
 try:
-    from .config import STATE_FILE
+    from .config import STATE_FILE, STATE_FLUSH_DELAY, STATE_RETRY_MAX
 except ImportError:
-    from src.config import STATE_FILE
+    from src.config import STATE_FILE, STATE_FLUSH_DELAY, STATE_RETRY_MAX
+
+
+def _default_state():
+    return {"last_bat": None, "stopped": True, "profiles": {}}
+
+
+class StateStore:
+    """In-memory application state with debounced, crash-safe writes.
+
+    Changes are written by a background thread `delay` seconds after the last
+    one, via a temp file, fsync and an atomic rename, so a crash at any point
+    leaves either the old or the new file on disk. A failed write is retried
+    with a delay that doubles up to `retry_max` seconds; it is logged once.
+
+    replace: function used for the final rename (os.replace); tests can pass a
+             failing one to simulate a crash between the write and the rename.
+    clock: wall-clock time source used for uptime accounting.
+    """
+
+    def __init__(self, path, delay=STATE_FLUSH_DELAY, replace=os.replace, clock=time.time,
+                 retry_max=STATE_RETRY_MAX):
+        self.path = path
+        self.tmp_path = path.with_name(path.name + ".tmp")
+        self.delay = delay
+        self.retry_max = retry_max
+        self.replace = replace
+        self.clock = clock
+        self._data = None
+        self._running = None  # (profile, started_at) of the current session
+        self._dirty = False
+        self._changed_at = 0.0
+        self._failures = 0
+        self._retry_at = 0.0  # no write attempt before this monotonic time
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._write_lock = threading.Lock()
+        self._thread = None
+        # Changed only under self._lock, unlike Thread.is_alive() which stays True
+        # for a moment after the writer loop has given up the lock for good
+        self._writer_active = False
+
+    def _load(self):
+        # Called with self._lock held
+        if self._data is not None:
+            return self._data
+        data = _default_state()
+        try:
+            if self.path.exists():
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data.update(json.load(f))
+                logging.info(f"Загружено состояние: {data['last_bat']}, stopped={data['stopped']}")
+        except Exception as e:
+            logging.error(f"Ошибка при загрузке состояния: {e}")
+        self._data = data
+        return data
+
+    def get(self):
+        """Return the last used profile and run state."""
+        with self._lock:
+            data = self._load()
+            return {"last_bat": data["last_bat"], "stopped": data["stopped"]}
+
+    def profile_history(self):
+        """Return a copy of the per-profile usage history."""
+        with self._lock:
+            return copy.deepcopy(self._load()["profiles"])
+
+    def _profile(self, name):
+        return self._load()["profiles"].setdefault(
+            name, {"activations": 0, "uptime": 0.0, "last_started": None, "last_failure": None}
+        )
+
+    def _end_session(self):
+        if self._running:
+            name, started = self._running
+            self._profile(name)["uptime"] += max(0.0, self.clock() - started)
+            self._running = None
+
+    def update(self, last_bat=None, stopped=False):
+        """Set the last used profile and run state, recording profile activations."""
+        with self._lock:
+            data = self._load()
+            data["last_bat"] = last_bat
+            data["stopped"] = stopped
+            running = self._running[0] if self._running else None
+            if stopped or last_bat != running:
+                self._end_session()
+            if last_bat and not stopped and last_bat != running:
+                now = self.clock()
+                profile = self._profile(last_bat)
+                profile["activations"] += 1
+                profile["last_started"] = datetime.fromtimestamp(now).isoformat(timespec="seconds")
+                self._running = (last_bat, now)
+            self._mark_dirty()
+        logging.info(f"Сохранено состояние: last_bat={last_bat}, stopped={stopped}")
+
+    def record_failure(self, profile, reason):
+        """Remember the last failure of a profile."""
+        with self._lock:
+            self._profile(profile)["last_failure"] = {
+                "time": datetime.fromtimestamp(self.clock()).isoformat(timespec="seconds"),
+                "reason": reason,
+            }
+            self._mark_dirty()
+        logging.info(f"Записан сбой профиля {profile}: {reason}")
+
+    def close(self):
+        """End the running session's uptime accounting and write synchronously.
+
+        A failed write is not retried: this runs at interpreter exit, where no
+        new writer thread may be started.
+        """
+        with self._lock:
+            if self._data is not None:
+                self._end_session()
+                self._dirty = True
+        self.flush(retry=False)
+        with self._lock:
+            # A waiting writer finds nothing left to write and exits
+            self._wake.notify()
+
+    def _mark_dirty(self, start_writer=True):
+        # Called with self._lock held
+        self._dirty = True
+        self._changed_at = time.monotonic()
+        if not self._writer_active:
+            if not start_writer:
+                return
+            self._writer_active = True
+            self._thread = threading.Thread(target=self._writer, name="StateWriter", daemon=True)
+            self._thread.start()
+        else:
+            self._wake.notify()
+
+    def _writer(self):
+        with self._lock:
+            try:
+                while self._dirty:
+                    due = max(self._changed_at + self.delay, self._retry_at)
+                    remaining = due - time.monotonic()
+                    if remaining > 0:
+                        self._wake.wait(remaining)
+                        continue
+                    self._lock.release()
+                    try:
+                        self.flush()
+                    finally:
+                        self._lock.acquire()
+            finally:
+                self._writer_active = False
+
+    def flush(self, retry=True):
+        """Write pending changes now. Returns True if the file is up to date.
+
+        retry: on failure, let the writer thread try again later (starting it if needed).
+        """
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return True
+                self._dirty = False
+                snapshot = copy.deepcopy(self._data)
+            try:
+                with open(self.tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(snapshot, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.replace(self.tmp_path, self.path)
+            except Exception as e:
+                with self._lock:
+                    self._failures += 1
+                    backoff = max(self.delay, 0.1) * 2 ** min(self._failures - 1, 16)
+                    retry_in = min(backoff, self.retry_max)
+                    self._retry_at = time.monotonic() + retry_in
+                    # Retried by the writer thread (restarted if it has exited)
+                    self._mark_dirty(start_writer=retry)
+                    failures = self._failures
+                if failures == 1:
+                    logging.error(f"Ошибка при сохранении состояния: {e}")
+                else:
+                    logging.debug(f"Повторная ошибка при сохранении состояния ({failures}): {e}")
+                return False
+            with self._lock:
+                if self._failures:
+                    logging.info(f"Состояние сохранено после {self._failures} неудачных попыток")
+                self._failures = 0
+                self._retry_at = 0.0
+            return True
+
+
+_store = StateStore(STATE_FILE)
 
 
 def save_state(last_bat=None, stopped=False):
-    """Save application state to file."""
-    try:
-        data = {"last_bat": last_bat, "stopped": stopped}
-        with open(STATE_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f)
-        logging.info(f"Сохранено состояние: {data}")
-    except Exception as e:
-        logging.error(f"Ошибка при сохранении состояния: {e}")
+    """Save application state (written to disk in the background)."""
+    _store.update(last_bat=last_bat, stopped=stopped)
 
 
 def load_state():
-    """Load application state from file."""
-    try:
-        if STATE_FILE.exists():
-            with open(STATE_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            logging.info(f"Загружено состояние: {data}")
-            return data
-    except Exception as e:
-        logging.error(f"Ошибка при загрузке состояния: {e}")
-    return {"last_bat": None, "stopped": True}
+    """Load application state."""
+    return _store.get()
+
+
+def record_failure(profile, reason):
+    """Record a failure of a profile in its usage history."""
+    _store.record_failure(profile, reason)
+
+
+def get_profile_history():
+    """Return per-profile activation count, total uptime and last failure."""
+    return _store.profile_history()
+
+
+def flush_state():
+    """Finish the current session and write the state file synchronously."""
+    _store.close()
+
 
+atexit.register(flush_state)
@@ -4,19 +4,26 @@ import re
 import sys
 import threading
 import logging
+from datetime import datetime
 from pathlib import Path
 
-from PyQt5.QtWidgets import QApplication, QSystemTrayIcon, QMenu, QAction
+from PyQt5.QtWidgets import QApplication, QSystemTrayIcon, QMenu, QAction, QInputDialog
 from PyQt5.QtGui import QIcon, QFont
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer, QObject, pyqtSignal, pyqtSlot
 
 # Handle both relative and absolute imports
 try:
-    from .config import ICON_PATH, CHECK_ICON_PATH, BASE_DIR
-    from . import service, autostart, state, updater
+    from .config import (
+        ICON_PATH, CHECK_ICON_PATH, BASE_DIR, STATS_DIR, MONITOR_INTERVAL,
+        WATCHDOG_ENABLED, WATCHDOG_RANKING,
+    )
+    from . import service, autostart, state, updater, monitor, watchdog, hostindex
 except ImportError:
-    from src.config import ICON_PATH, CHECK_ICON_PATH, BASE_DIR
-    from src import service, autostart, state, updater
+    from src.config import (
+        ICON_PATH, CHECK_ICON_PATH, BASE_DIR, STATS_DIR, MONITOR_INTERVAL,
+        WATCHDOG_ENABLED, WATCHDOG_RANKING,
+    )
+    from src import service, autostart, state, updater, monitor, watchdog, hostindex
 
 
 def open_config_folder():
@@ -28,11 +35,16 @@ def open_config_folder():
         logging.error(f"Ошибка при открытии папки конфигурации: {e}")
 
 
-def create_start_handler(batch_path, start_menu, actions):
+def create_start_handler(batch_path, start_menu, actions, resource_monitor=None,
+                         connectivity_watchdog=None):
     """Create a handler function for starting a service."""
     def handler():
         display_version = batch_path.stem
         state.save_state(last_bat=batch_path.stem, stopped=False)
+        if resource_monitor:
+            resource_monitor.set_profile(batch_path.stem)
+        if connectivity_watchdog:
+            connectivity_watchdog.set_profile(batch_path)
         threading.Thread(
             target=lambda: service.start_service(batch_path, display_version),
             daemon=True
@@ -41,9 +53,28 @@ def create_start_handler(batch_path, start_menu, actions):
     return handler
 
 
-def on_stop(start_menu, actions):
+class ProfileSwitcher(QObject):
+    """Runs profile switches requested from worker threads on the GUI thread."""
+
+    requested = pyqtSignal(object)
+
+    def __init__(self, switch):
+        super().__init__()
+        self._switch = switch
+        self.requested.connect(self._on_requested)
+
+    @pyqtSlot(object)
+    def _on_requested(self, batch_path):
+        self._switch(batch_path)
+
+
+def on_stop(start_menu, actions, resource_monitor=None, connectivity_watchdog=None):
     """Handle stop action."""
     state.save_state(last_bat=None, stopped=True)
+    if resource_monitor:
+        resource_monitor.set_profile(None)
+    if connectivity_watchdog:
+        connectivity_watchdog.set_profile(None)
     threading.Thread(
         target=lambda: (
             service.stop_service(),
@@ -54,8 +85,13 @@ def on_stop(start_menu, actions):
     ).start()
 
 
-def on_exit(tray, start_menu, actions):
+def on_exit(tray, start_menu, actions, resource_monitor=None, connectivity_watchdog=None):
     """Handle exit action."""
+    if resource_monitor:
+        resource_monitor.stop()
+    if connectivity_watchdog:
+        connectivity_watchdog.stop()
+    state.flush_state()
     service.stop_service()
     service.delete_service()
     update_menu_styles(start_menu, actions, None)
@@ -94,6 +130,42 @@ def create_tray_notifier(tray):
     return _notify
 
 
+def create_alert_handler(tray):
+    """Return an on_alert callback for ResourceMonitor that notifies via the tray."""
+    notifier = create_tray_notifier(tray)
+
+    def _alert(metric, value, limit):
+        if metric == "rss":
+            mb = 1024 * 1024
+            text = f"winws.exe использует {value / mb:.0f} MB памяти (порог {limit / mb:.0f} MB)"
+        else:
+            text = f"winws.exe: {metric} = {value:g} (порог {limit:g})"
+        notifier("Ресурсы", text, True)
+    return _alert
+
+
+def update_tray_tooltip(tray, resource_monitor):
+    """Show the active profile and current resource usage in the tray tooltip."""
+    sample = resource_monitor.current()
+    if sample is None:
+        tray.setToolTip("Moonstone")
+        return
+    tray.setToolTip(f"Moonstone - {sample['profile']}\n{monitor.format_sample(sample)}")
+
+
+def on_export_stats(tray, resource_monitor):
+    """Export the resource usage history to the stats folder."""
+    notifier = create_tray_notifier(tray)
+    profile = resource_monitor.profile or "none"
+    path = STATS_DIR / f"winws_{profile}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    try:
+        resource_monitor.export_history(path)
+        notifier("Статистика", f"Сохранено: {path.name}", False)
+    except Exception as e:
+        logging.error(f"Ошибка при экспорте статистики: {e}")
+        notifier("Статистика", str(e), True)
+
+
 def on_update_bundled(tray):
     """Handle bundled files update."""
     notifier = create_tray_notifier(tray)
@@ -107,8 +179,39 @@ def on_update_bundled(tray):
     threading.Thread(target=run_update, daemon=True).start()
 
 
-def create_tray_app(bat_files):
-    """Create and configure the system tray application."""
+def on_check_domain(tray, bat_files):
+    """Ask for a domain and report which hostlists and profiles cover it."""
+    notifier = create_tray_notifier(tray)
+    domain, ok = QInputDialog.getText(None, "Moonstone", "Домен:")
+    domain = domain.strip()
+    if not ok or not domain:
+        return
+
+    def run_check():
+        try:
+            hostindex.build_index()
+            result = hostindex.check_domain(domain, bat_files)
+        except Exception as e:  # noqa: BLE001
+            logging.error(f"Ошибка при проверке домена {domain}: {e}", exc_info=True)
+            notifier("Проверка домена", str(e), True)
+            return
+        logging.info(hostindex.format_result(result))
+        if not result["matches"]:
+            notifier(domain, "Не найден ни в одном списке", False)
+            return
+        lines = []
+        for match in result["matches"]:
+            profiles = sorted({profile for profile, _, _ in match["sections"]})
+            lines.append(f"{match['entry']} ({match['list']}): {', '.join(profiles) or 'не используется'}")
+        notifier(domain, "\n".join(lines), False)
+    threading.Thread(target=run_check, daemon=True).start()
+
+
+def create_tray_app(bat_files, restore_last=True):
+    """Create and configure the system tray application.
+
+    restore_last: start the last used profile (False when main() already did it).
+    """
     logging.info("Запуск основного приложения")
     if not ICON_PATH.exists():
         logging.error(f"Иконка не найдена: {ICON_PATH}")
@@ -156,22 +259,51 @@ def create_tray_app(bat_files):
             }
         """)
 
+        resource_monitor = monitor.ResourceMonitor(on_alert=create_alert_handler(tray))
         actions = {}
+        # The watchdog tracks its own failover target, so the handler leaves it alone
+        profile_switcher = ProfileSwitcher(
+            lambda bat: create_start_handler(bat, start_menu, actions, resource_monitor)())
+        connectivity_watchdog = watchdog.ConnectivityWatchdog(
+            watchdog.rank_profiles(bat_files, WATCHDOG_RANKING, state.get_profile_history()),
+            switch_profile=profile_switcher.requested.emit,
+            notify=create_tray_notifier(tray),
+        )
+
         for bat in bat_files:
             action = start_menu.addAction(bat.stem)
-            action.triggered.connect(create_start_handler(bat, start_menu, actions))
+            action.triggered.connect(create_start_handler(
+                bat, start_menu, actions, resource_monitor, connectivity_watchdog))
             actions[bat] = action
 
         menu.addMenu(start_menu)
         stop_action = menu.addAction("Stop")
-        stop_action.triggered.connect(lambda: on_stop(start_menu, actions))
+        stop_action.triggered.connect(
+            lambda: on_stop(start_menu, actions, resource_monitor, connectivity_watchdog))
 
         config_action = menu.addAction("Config")
         config_action.triggered.connect(open_config_folder)
 
+        stats_action = menu.addAction("Stats")
+        stats_action.triggered.connect(lambda: on_export_stats(tray, resource_monitor))
+
+        check_domain_action = menu.addAction("Check domain…")
+        check_domain_action.triggered.connect(lambda: on_check_domain(tray, bat_files))
+
         update_bundled_action = menu.addAction("⭳ Zapret")
         update_bundled_action.triggered.connect(lambda: on_update_bundled(tray))
 
+        watchdog_action = menu.addAction("Watchdog")
+        watchdog_action.setCheckable(True)
+        watchdog_action.setChecked(WATCHDOG_ENABLED)
+
+        def toggle_watchdog(checked):
+            if checked:
+                connectivity_watchdog.start()
+            else:
+                connectivity_watchdog.stop()
+        watchdog_action.toggled.connect(toggle_watchdog)
+
         autostart_action = menu.addAction("Autostart")
         autostart_action.setCheckable(True)
         autostart_action.setChecked(autostart.is_autostart_enabled())
@@ -184,7 +316,8 @@ def create_tray_app(bat_files):
         autostart_action.toggled.connect(toggle_autostart)
 
         exit_action = menu.addAction("Exit")
-        exit_action.triggered.connect(lambda: on_exit(tray, start_menu, actions))
+        exit_action.triggered.connect(
+            lambda: on_exit(tray, start_menu, actions, resource_monitor, connectivity_watchdog))
 
         # Determine active version from service display name
         display_name = service.get_service_display_name()
@@ -194,6 +327,9 @@ def create_tray_app(bat_files):
             if match:
                 active_version = match.group(1)
         update_menu_styles(start_menu, actions, active_version)
+        resource_monitor.set_profile(active_version)
+        connectivity_watchdog.set_profile(
+            next((bat for bat in bat_files if bat.stem == active_version), None))
 
         tray.setContextMenu(menu)
         tray.show()
@@ -202,17 +338,28 @@ def create_tray_app(bat_files):
 
         # Auto-start last used service if state indicates it should be running
         app_state = state.load_state()
-        if app_state["last_bat"] and not app_state["stopped"]:
+        if restore_last and app_state["last_bat"] and not app_state["stopped"]:
             for bat in bat_files:
                 if bat.stem == app_state["last_bat"]:
                     logging.info(f"Автозапуск последнего использованного bat: {bat.stem}")
+                    state.save_state(last_bat=bat.stem, stopped=False)
                     threading.Thread(
-                        target=lambda: service.start_service(bat, bat.stem),
+                        target=lambda: service.ensure_service(bat, bat.stem),
                         daemon=True
                     ).start()
                     update_menu_styles(start_menu, actions, bat.stem)
+                    resource_monitor.set_profile(bat.stem)
+                    connectivity_watchdog.set_profile(bat)
                     break
 
+        # Sample winws.exe in the background, refresh the tooltip from the GUI thread
+        resource_monitor.start()
+        if WATCHDOG_ENABLED:
+            connectivity_watchdog.start()
+        tooltip_timer = QTimer()
+        tooltip_timer.timeout.connect(lambda: update_tray_tooltip(tray, resource_monitor))
+        tooltip_timer.start(int(MONITOR_INTERVAL * 1000))
+
         logging.info("Запуск главного цикла приложения")
         return app.exec_()
 
@@ -0,0 +1,295 @@
+"""Connectivity watchdog: probes hosts of the active profile and fails over to the next one."""
+import logging
+import random
+import socket
+import ssl
+import threading
+import time
+from collections import deque
+
+# Handle both relative and absolute imports
+try:
+    from .config import (
+        ENCODING,
+        WATCHDOG_INTERVAL,
+        WATCHDOG_HOSTS,
+        WATCHDOG_TIMEOUT,
+        WATCHDOG_WINDOW,
+        WATCHDOG_MIN_SAMPLES,
+        WATCHDOG_DEGRADED_BELOW,
+        WATCHDOG_RECOVERED_ABOVE,
+        WATCHDOG_CONFIRM_ROUNDS,
+        WATCHDOG_GRACE,
+    )
+    from . import service, state
+except ImportError:
+    from src.config import (
+        ENCODING,
+        WATCHDOG_INTERVAL,
+        WATCHDOG_HOSTS,
+        WATCHDOG_TIMEOUT,
+        WATCHDOG_WINDOW,
+        WATCHDOG_MIN_SAMPLES,
+        WATCHDOG_DEGRADED_BELOW,
+        WATCHDOG_RECOVERED_ABOVE,
+        WATCHDOG_CONFIRM_ROUNDS,
+        WATCHDOG_GRACE,
+    )
+    from src import service, state
+
+# Hosts kept per profile (reservoir sample of its hostlists)
+HOST_SAMPLE_SIZE = 100
+
+_ssl_context = None
+
+
+def tls_probe(host, timeout=WATCHDOG_TIMEOUT, port=443):
+    """Do a TLS handshake with host:443. Returns (ok, latency_seconds or None).
+
+    ok is None when the host does not resolve: that says nothing about the
+    bypass, so it is not counted as a sample. The certificate is not verified:
+    a completed handshake already shows the ClientHello got through, and bare
+    hostlist domains are often served with a certificate for another name.
+    """
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = ssl.create_default_context()
+        _ssl_context.check_hostname = False
+        _ssl_context.verify_mode = ssl.CERT_NONE
+    try:
+        address = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0][4][:2]
+    except (socket.gaierror, UnicodeError) as e:
+        logging.debug(f"Хост {host} не разрешается, проба пропущена: {e}")
+        return None, None
+    started = time.monotonic()
+    try:
+        with socket.create_connection(address, timeout=timeout) as sock:
+            with _ssl_context.wrap_socket(sock, server_hostname=host):
+                pass
+        return True, time.monotonic() - started
+    except OSError as e:
+        logging.debug(f"Проба {host} не удалась: {e}")
+        return False, None
+
+
+def sample_profile_hosts(batch_path, size=HOST_SAMPLE_SIZE, rng=random):
+    """Return up to `size` random domains from the hostlists of a profile."""
+    _, args = service.parse_bat_file(batch_path)
+    hosts = []
+    seen = 0
+    for path in service.get_hostlist_paths(args):
+        try:
+            with open(path, "r", encoding=ENCODING, errors="ignore") as f:
+                for line in f:
+                    host = line.strip().lstrip("*.")
+                    if not host or host.startswith("#"):
+                        continue
+                    # Reservoir sampling keeps memory flat for million-line lists
+                    seen += 1
+                    if len(hosts) < size:
+                        hosts.append(host)
+                    else:
+                        j = rng.randrange(seen)
+                        if j < size:
+                            hosts[j] = host
+        except OSError as e:
+            logging.error(f"Не удалось прочитать список хостов {path}: {e}")
+    return hosts
+
+
+def rank_profiles(bat_files, ranking, history=None):
+    """Order profiles for failover.
+
+    With `ranking` names, only those profiles in that order. Otherwise profiles
+    without a recorded failure come first, then by total uptime from `history`.
+    """
+    if ranking:
+        by_name = {bat.stem: bat for bat in bat_files}
+        return [by_name[name] for name in ranking if name in by_name]
+    history = history or {}
+
+    def key(bat):
+        entry = history.get(bat.stem, {})
+        return (entry.get("last_failure") is not None, -entry.get("uptime", 0.0))
+    return sorted(bat_files, key=key)
+
+
+class ConnectivityWatchdog:
+    """Background prober of the active profile with automatic failover.
+
+    ranking: profile .bat paths in failover order.
+    switch_profile: callable(batch_path) that activates a profile via the service layer.
+                    It is called on the watchdog thread.
+    probe: callable(host, timeout) -> (ok, latency); ok None means no sample.
+    hosts_for: callable(batch_path) -> list of hosts to probe.
+    clock: monotonic time source used for the sliding window and grace period.
+    notify: callable(title, message, is_error) for tray messages.
+    """
+
+    def __init__(self, ranking, switch_profile, probe=tls_probe,
+                 hosts_for=sample_profile_hosts, clock=time.monotonic, notify=None,
+                 interval=WATCHDOG_INTERVAL, hosts_per_round=WATCHDOG_HOSTS,
+                 timeout=WATCHDOG_TIMEOUT, window=WATCHDOG_WINDOW,
+                 min_samples=WATCHDOG_MIN_SAMPLES, degraded_below=WATCHDOG_DEGRADED_BELOW,
+                 recovered_above=WATCHDOG_RECOVERED_ABOVE,
+                 confirm_rounds=WATCHDOG_CONFIRM_ROUNDS, grace=WATCHDOG_GRACE, rng=None):
+        self.ranking = list(ranking)
+        self.switch_profile = switch_profile
+        self.probe = probe
+        self.hosts_for = hosts_for
+        self.clock = clock
+        self.notify = notify
+        self.interval = interval
+        self.hosts_per_round = hosts_per_round
+        self.timeout = timeout
+        self.window = window
+        self.min_samples = min_samples
+        self.degraded_below = degraded_below
+        self.recovered_above = recovered_above
+        self.confirm_rounds = confirm_rounds
+        self.grace = grace
+        self.rng = rng or random.Random()
+        self.profile = None
+        self.degraded = False
+        self._results = deque()
+        self._hosts = {}
+        self._degraded_rounds = 0
+        self._tried = set()
+        self._exhausted = False
+        self._grace_until = 0.0
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the prober thread."""
+        if self._thread and self._thread.is_alive() and not self._stop.is_set():
+            return
+        # A stopped thread may still finish its probes, so each thread gets its own event
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop,),
+                                        name="ConnectivityWatchdog", daemon=True)
+        self._thread.start()
+        logging.info(f"Watchdog запущен, интервал {self.interval} с")
+
+    def stop(self):
+        """Stop the prober thread without waiting for probes in flight.
+
+        The thread is a daemon and discards the results of its last round.
+        """
+        self._stop.set()
+        logging.info("Watchdog остановлен")
+
+    def set_profile(self, profile):
+        """Track a newly activated profile (None when stopped) and reset the window."""
+        with self._lock:
+            self.profile = profile
+            self.degraded = False
+            self._results.clear()
+            self._degraded_rounds = 0
+            self._tried.clear()
+            self._exhausted = False
+            self._grace_until = self.clock() + self.grace
+
+    def _run(self, stop):
+        while not stop.is_set():
+            try:
+                self.run_round(stop)
+            except (Exception, SystemExit) as e:  # parse_bat_file exits on bad profiles
+                logging.error(f"Ошибка watchdog: {e}")
+            stop.wait(self.interval)
+
+    def stats(self):
+        """Return success rate and mean latency over the sliding window."""
+        with self._lock:
+            self._prune()
+            total = len(self._results)
+            ok = [latency for _, success, latency in self._results if success]
+            return {
+                "profile": self.profile.stem if self.profile else None,
+                "samples": total,
+                "success_rate": len(ok) / total if total else None,
+                "latency": sum(ok) / len(ok) if ok else None,
+                "degraded": self.degraded,
+            }
+
+    def _prune(self):
+        horizon = self.clock() - self.window
+        while self._results and self._results[0][0] < horizon:
+            self._results.popleft()
+
+    def _hosts_of(self, profile):
+        if profile not in self._hosts:
+            self._hosts[profile] = self.hosts_for(profile)
+            logging.info(f"Watchdog: {len(self._hosts[profile])} хостов для {profile.stem}")
+        return self._hosts[profile]
+
+    def run_round(self, stop=None):
+        """Probe a few hosts of the active profile and fail over if it is degraded.
+
+        stop: event of the calling thread; results are dropped once it is set.
+        """
+        with self._lock:
+            profile = self.profile
+            if profile is None or self.clock() < self._grace_until:
+                return
+        hosts = self._hosts_of(profile)
+        if not hosts:
+            return
+        picked = self.rng.sample(hosts, min(self.hosts_per_round, len(hosts)))
+        results = [(self.clock(), *self.probe(host, self.timeout)) for host in picked]
+        results = [r for r in results if r[1] is not None]
+        with self._lock:
+            # A switch or stop during the probes makes these results meaningless
+            if profile != self.profile or (stop is not None and stop.is_set()):
+                return
+            self._results.extend(results)
+            self._evaluate()
+
+    def _evaluate(self):
+        stats = self.stats()
+        rate = stats["success_rate"]
+        if stats["samples"] < self.min_samples:
+            return
+        logging.info(f"Watchdog {stats['profile']}: успешность {rate:.0%}, "
+                     f"задержка {stats['latency'] or 0:.3f} с, проб {stats['samples']}")
+        if not self.degraded and rate < self.degraded_below:
+            self.degraded = True
+            self._degraded_rounds = 1
+            logging.warning(f"Watchdog: профиль {stats['profile']} деградировал ({rate:.0%})")
+        elif self.degraded and rate >= self.recovered_above:
+            self.degraded = False
+            self._degraded_rounds = 0
+            self._tried.clear()
+            self._exhausted = False
+            logging.info(f"Watchdog: профиль {stats['profile']} восстановился ({rate:.0%})")
+        elif self.degraded:
+            self._degraded_rounds += 1
+        if self.degraded and self._degraded_rounds >= self.confirm_rounds:
+            self._failover(rate)
+
+    def _failover(self, rate):
+        current = self.profile
+        self._tried.add(current)
+        start = self.ranking.index(current) + 1 if current in self.ranking else 0
+        ordered = self.ranking[start:] + self.ranking[:start]
+        candidate = next((p for p in ordered if p not in self._tried), None)
+        if candidate is None:
+            if not self._exhausted:
+                self._exhausted = True
+                logging.error("Watchdog: все профили из рейтинга не работают")
+                self._notify("Watchdog", "Все профили не работают, переключение отменено", True)
+            return
+        logging.warning(f"Watchdog: переключение {current.stem} -> {candidate.stem}")
+        state.record_failure(current.stem, f"watchdog: успешность {rate:.0%}")
+        self._notify("Watchdog",
+                     f"{current.stem} не работает ({rate:.0%}), переключение на {candidate.stem}",
+                     True)
+        tried = set(self._tried)
+        self.switch_profile(candidate)
+        self.set_profile(candidate)
+        self._tried = tried
+
+    def _notify(self, title, message, is_error):
+        if self.notify:
+            self.notify(title, message, is_error)
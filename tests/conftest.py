@@ -0,0 +1,12 @@
+"""Shared fixtures: keep the app state file out of the working tree."""
+import pytest
+
+from src import state
+
+
+@pytest.fixture(autouse=True)
+def state_store(tmp_path, monkeypatch):
+    store = state.StateStore(tmp_path / "moonstone_state.json")
+    monkeypatch.setattr(state, "_store", store)
+    yield store
+    store.close()
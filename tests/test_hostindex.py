@@ -0,0 +1,85 @@
+"""Hostlist index build, incremental rebuild and lookups."""
+import threading
+
+from src import hostindex
+from benchmarks.fakes import make_zapret_tree
+
+
+def write_lists(root):
+    root.mkdir()
+    general = root / "list-general.txt"
+    general.write_text("youtube.com\nmusic.youtube.com\ndiscord.gg\n", encoding="utf-8")
+    extra = root / "list-extra.txt"
+    extra.write_text("youtube.com\n# comment\nexample.org\n", encoding="utf-8")
+    return [general, extra]
+
+
+def test_lookup_covers_parent_domains(tmp_path):
+    paths = write_lists(tmp_path / "lists")
+    hostindex.build_index(paths, tmp_path / "index")
+    with hostindex.HostIndex(tmp_path / "index") as index:
+        assert index.count == 4
+        assert sorted(index.lookup("www.music.youtube.com")) == [
+            ("music.youtube.com", "list-general.txt"),
+            ("youtube.com", "list-extra.txt"),
+            ("youtube.com", "list-general.txt"),
+        ]
+        assert index.lookup("notyoutube.com") == []
+
+
+def test_rebuild_reads_only_changed_lists(tmp_path):
+    general, extra = write_lists(tmp_path / "lists")
+    hostindex.build_index([general, extra], tmp_path / "index")
+    assert hostindex.build_index([general, extra], tmp_path / "index")["changed"] == []
+
+    with open(extra, "a", encoding="utf-8") as f:
+        f.write("new.example.net\n")
+    summary = hostindex.build_index([general, extra], tmp_path / "index")
+    assert summary["changed"] == ["list-extra.txt"]
+    assert summary["domains"] == 5
+
+    summary = hostindex.build_index([general], tmp_path / "index")
+    assert summary["removed"] == ["list-extra.txt"]
+    with hostindex.HostIndex(tmp_path / "index") as index:
+        assert index.lookup("example.org") == []
+
+
+def test_concurrent_builds_do_not_collide(tmp_path):
+    paths = write_lists(tmp_path / "lists")
+    errors = []
+
+    def build():
+        try:
+            hostindex.build_index(paths, tmp_path / "index", force=True)
+        except Exception as e:  # noqa: BLE001
+            errors.append(e)
+
+    threads = [threading.Thread(target=build) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    with hostindex.HostIndex(tmp_path / "index") as index:
+        assert index.count == 4
+
+
+def test_check_domain_on_bundled_profiles(tmp_path):
+    bat_files = make_zapret_tree(tmp_path / "zapret")
+    hostlists = sorted((tmp_path / "zapret" / "lists").glob("*.txt"))
+    hostindex.build_index(hostlists, tmp_path / "index")
+
+    coverage = hostindex.profile_coverage(bat_files)
+    assert set(coverage) == {"list-general.txt"}
+    assert ("general", 3, "--filter-tcp=443") in coverage["list-general.txt"]
+
+    result = hostindex.check_domain("www.youtube.com", bat_files, tmp_path / "index", coverage)
+    assert [(m["entry"], m["list"]) for m in result["matches"]] == [
+        ("www.youtube.com", "list-general.txt"), ("youtube.com", "list-general.txt")]
+    assert result["matches"][0]["sections"] == coverage["list-general.txt"]
+
+    # WinDivert filter words in rules.txt are not domains
+    with hostindex.HostIndex(tmp_path / "index") as index:
+        assert index.lookup("or") == []
+        assert index.lookup("and") == []
+        assert index.count == len(hostindex._read_keys(hostlists[0]))
@@ -0,0 +1,82 @@
+"""ResourceMonitor against a stand-in child process."""
+import subprocess
+import sys
+
+import pytest
+
+psutil = pytest.importorskip("psutil")
+
+from src import monitor
+
+# Holds ~64 MB and 4 extra threads until killed
+CHILD = """
+import threading, time
+data = bytearray(64 * 1024 * 1024)
+for _ in range(4):
+    threading.Thread(target=time.sleep, args=(600,), daemon=True).start()
+print("ready", flush=True)
+time.sleep(600)
+"""
+
+
+@pytest.fixture
+def child():
+    proc = subprocess.Popen([sys.executable, "-c", CHILD], stdout=subprocess.PIPE, text=True)
+    assert proc.stdout.readline().strip() == "ready"
+    yield psutil.Process(proc.pid)
+    proc.kill()
+    proc.wait()
+
+
+def test_sample_reads_child_process(child):
+    resource_monitor = monitor.ResourceMonitor(find_process=lambda: child, thresholds={})
+    resource_monitor.set_profile("general")
+    sample = resource_monitor.sample()
+    assert sample["pid"] == child.pid
+    assert sample["profile"] == "general"
+    assert sample["rss"] >= 64 * 1024 * 1024
+    assert sample["threads"] >= 5
+    assert sample["handles"] > 0
+    assert resource_monitor.current() is sample
+
+
+def test_history_evicts_oldest(child):
+    resource_monitor = monitor.ResourceMonitor(find_process=lambda: child, history=3, thresholds={})
+    resource_monitor.set_profile("general")
+    samples = [resource_monitor.sample() for _ in range(5)]
+    assert resource_monitor.history() == samples[-3:]
+
+
+def test_alert_fires_once_after_alert_samples(child):
+    alerts = []
+    resource_monitor = monitor.ResourceMonitor(
+        find_process=lambda: child, thresholds={"rss": 1024}, alert_samples=3,
+        on_alert=lambda metric, value, limit: alerts.append((metric, limit)))
+    resource_monitor.set_profile("general")
+    for _ in range(2):
+        resource_monitor.sample()
+    assert alerts == []
+    for _ in range(5):
+        resource_monitor.sample()
+    assert alerts == [("rss", 1024)]
+
+
+def test_no_lookup_without_profile_and_back_off():
+    calls = []
+    now = [0.0]
+
+    def find_process():
+        calls.append(now[0])
+        return None
+
+    resource_monitor = monitor.ResourceMonitor(find_process=find_process, interval=5.0,
+                                               backoff_max=20.0, clock=lambda: now[0])
+    for _ in range(10):
+        assert resource_monitor.sample() is None
+    assert calls == []
+
+    resource_monitor.set_profile("general")
+    while now[0] <= 100.0:
+        resource_monitor.sample()
+        now[0] += 5.0
+    assert calls == [0.0, 5.0, 15.0, 35.0, 55.0, 75.0, 95.0]
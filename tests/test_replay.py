@@ -0,0 +1,128 @@
+"""Trace readers, section matching, reordering and profile rewriting of src.replay."""
+import struct
+from collections import Counter
+
+import pytest
+
+from src import replay
+from benchmarks.fakes import make_zapret_tree
+
+DOMAINS = {"youtube.com", "discord.gg", "googlevideo.com"}
+
+
+def make_sections(*specs):
+    return [replay.parse_section(i, tokens.split()) for i, tokens in enumerate(specs)]
+
+
+def flow(proto, port, host=None, l7=None):
+    return {"proto": proto, "port": port, "host": host, "l7": l7, "count": 1}
+
+
+def matched_section(sections, item):
+    """Index of the section that handles a flow (first match), or None."""
+    for section in sections:
+        if replay.match_section(section, item)[0]:
+            return section["index"]
+    return None
+
+
+def as_counter(flows):
+    counts = Counter()
+    for f in flows:
+        counts[(f["proto"], f["port"], f["host"], f["l7"])] += f["count"]
+    return counts
+
+
+def test_pcap_and_csv_readers_agree(tmp_path):
+    flows = replay.generate_flows(300, DOMAINS, seed=3)
+    from_csv = replay.read_trace(replay.write_csv(tmp_path / "trace.csv", flows))
+    from_pcap = replay.read_trace(replay.write_pcap(tmp_path / "trace.pcap", flows, seed=3))
+    # QUIC Initial packets are encrypted: a capture has no host for them
+    expected = as_counter({**f, "host": None} if f["l7"] == "quic" else f for f in from_csv)
+    assert as_counter(from_pcap) == expected
+    assert sum(f["count"] for f in from_pcap) == 300
+
+
+def test_first_matching_section_wins():
+    sections = make_sections(
+        "--filter-udp=443 --filter-l7=quic",
+        "--filter-tcp=80,443 --hostlist-domains=youtube.com",
+        "--filter-tcp=443",
+        "--filter-udp=50000-50100",
+    )
+    assert matched_section(sections, flow("udp", 443, "youtube.com", "quic")) == 0
+    assert matched_section(sections, flow("tcp", 443, "www.youtube.com", "tls")) == 1
+    assert matched_section(sections, flow("tcp", 443, "example.org", "tls")) == 2
+    assert matched_section(sections, flow("tcp", 80, "example.org", "http")) is None
+    assert matched_section(sections, flow("udp", 50010, None, "discord")) == 3
+
+    stats = replay.replay(sections, [flow("tcp", 443, "www.youtube.com", "tls")])
+    assert stats["section_hits"] == {1: 1}
+    assert stats["entry_hits"] == {"--hostlist-domains:youtube.com": 1}
+
+
+def test_hostlist_suffix_matching(tmp_path):
+    hostlist = tmp_path / "list.txt"
+    hostlist.write_text("# comment\n*.youtube.com\ngooglevideo.com\n", encoding="utf-8")
+    exclude = tmp_path / "exclude.txt"
+    exclude.write_text("music.youtube.com\n", encoding="utf-8")
+    (section,) = make_sections(f"--filter-tcp=443 --hostlist={hostlist} --hostlist-exclude={exclude}")
+
+    assert replay.match_section(section, flow("tcp", 443, "youtube.com"))[0]
+    assert replay.match_section(section, flow("tcp", 443, "rr1.sn-abc.googlevideo.com"))[0]
+    assert not replay.match_section(section, flow("tcp", 443, "notyoutube.com"))[0]
+    assert not replay.match_section(section, flow("tcp", 443, "youtube.com.evil.net"))[0]
+    # Excluded subdomain and everything below it
+    assert not replay.match_section(section, flow("tcp", 443, "music.youtube.com"))[0]
+    assert not replay.match_section(section, flow("tcp", 443, "www.music.youtube.com"))[0]
+    assert not replay.match_section(section, flow("tcp", 443, None))[0]
+
+    matched, _, entry = replay.match_section(section, flow("tcp", 443, "www.youtube.com"))
+    assert matched and entry == "youtube.com"
+    assert section["include"][entry] == "list.txt"
+
+
+def test_suggested_order_keeps_matching_section():
+    sections = make_sections(
+        "--filter-tcp=80 --hostlist-domains=youtube.com",
+        "--filter-tcp=443 --hostlist-domains=discord.gg",
+        "--filter-tcp=443 --hostlist-domains=youtube.com",
+        "--filter-tcp=443",
+        "--filter-udp=443 --filter-l7=quic",
+        "--filter-udp=50000-50100",
+    )
+    flows = replay.generate_flows(2000, DOMAINS, seed=5)
+    current = replay.replay(sections, flows)
+    order = replay.suggest_order(sections, current)
+    assert [s["index"] for s in order] != current["order"]
+    for item in flows:
+        assert matched_section(order, item) == matched_section(sections, item)
+    suggested = replay.replay(order, flows)
+    assert suggested["section_hits"] == current["section_hits"]
+    assert suggested["avg_steps"] < current["avg_steps"]
+
+
+def test_written_profile_has_same_sections(tmp_path):
+    bat = make_zapret_tree(tmp_path / "zapret")[0]
+    _, sections = replay.load_profile(bat)
+    order = list(reversed(range(len(sections))))
+    out = replay.write_profile(bat, order, tmp_path / "zapret" / "reordered.bat")
+
+    _, rewritten = replay.load_profile(out)
+    assert [s["tokens"] for s in rewritten] == [sections[i]["tokens"] for i in order]
+    with pytest.raises(ValueError):
+        replay.write_profile(bat, order[1:], tmp_path / "zapret" / "broken.bat")
+
+
+def test_malformed_pcapng_is_skipped(tmp_path):
+    shb = struct.pack("<IIIHHqI", 0x0A0D0D0A, 28, 0x1A2B3C4D, 1, 0, -1, 28)
+    # Enhanced Packet Block for interface 3 without an Interface Description Block
+    frame = bytes(40)
+    epb = struct.pack("<IIIIIII", 6, 28 + len(frame) + 4, 3, 0, 0, len(frame), len(frame))
+    epb += frame + struct.pack("<I", 28 + len(frame) + 4)
+    # Packet block too short for its fixed fields, then one cut off mid-body
+    short = struct.pack("<II", 6, 12) + struct.pack("<I", 12)
+    truncated = struct.pack("<II", 6, 200) + bytes(20)
+    path = tmp_path / "broken.pcapng"
+    path.write_bytes(shb + epb + short + truncated)
+    assert replay.read_pcap(path) == []
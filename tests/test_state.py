@@ -0,0 +1,142 @@
+"""StateStore write-behind with fault injection between the write and the rename."""
+import json
+import os
+import time
+
+import pytest
+
+from src import state
+
+
+class FailingReplace:
+    """Stand-in for os.replace that fails until `healed` is set."""
+
+    def __init__(self):
+        self.healed = False
+        self.calls = 0
+
+    def __call__(self, src, dst):
+        self.calls += 1
+        if not self.healed:
+            raise OSError("injected failure before rename")
+        os.replace(src, dst)
+
+
+def read(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "moonstone_state.json"
+    store = state.StateStore(path)
+    store.update(last_bat="a", stopped=False)
+    assert store.flush()
+    return path
+
+
+def test_failed_rename_keeps_old_file_and_retries(path):
+    replace = FailingReplace()
+    store = state.StateStore(path, delay=0.05, replace=replace)
+    store.update(last_bat="b", stopped=False)
+    assert not store.flush()
+
+    # The old file is intact, the new content waits in the temp file
+    assert read(path)["last_bat"] == "a"
+    assert read(store.tmp_path)["last_bat"] == "b"
+
+    replace.healed = True
+    assert wait_for(lambda: read(path)["last_bat"] == "b")
+    assert not store.tmp_path.exists()
+
+
+def test_retry_after_writer_thread_exited(path):
+    replace = FailingReplace()
+    store = state.StateStore(path, delay=0.05, replace=replace)
+    store.update(last_bat="b", stopped=False)
+    # The writer finds nothing to do and exits while this flush is failing
+    assert not store.flush()
+    replace.healed = True
+    assert wait_for(lambda: read(path)["last_bat"] == "b")
+
+
+def test_failed_writes_are_retried_in_background(path):
+    replace = FailingReplace()
+    store = state.StateStore(path, delay=0.02, replace=replace)
+    store.update(last_bat="b", stopped=False)
+    assert wait_for(lambda: replace.calls >= 3)
+    assert read(path)["last_bat"] == "a"
+    replace.healed = True
+    assert wait_for(lambda: read(path)["last_bat"] == "b")
+
+
+def test_no_update_is_lost_while_writer_exits(tmp_path):
+    path = tmp_path / "moonstone_state.json"
+    store = state.StateStore(path, delay=0.0)
+    for i in range(300):
+        store.update(last_bat=f"p{i}", stopped=False)
+        if i % 7 == 0:
+            time.sleep(0.001)
+    assert wait_for(lambda: path.exists() and read(path)["last_bat"] == "p299")
+
+
+def test_history_counts_activations_and_uptime(tmp_path):
+    now = [1000.0]
+    store = state.StateStore(tmp_path / "moonstone_state.json", clock=lambda: now[0])
+    store.update(last_bat="general", stopped=False)
+    now[0] += 30.0
+    store.update(last_bat="alt", stopped=False)
+    now[0] += 10.0
+    store.update(last_bat="general", stopped=False)
+    store.close()
+    history = read(tmp_path / "moonstone_state.json")["profiles"]
+    assert history["general"]["activations"] == 2
+    assert history["general"]["uptime"] == 30.0
+    assert history["alt"]["uptime"] == 10.0
+
+
+def test_persistent_failure_backs_off_and_logs_once(path, caplog):
+    replace = FailingReplace()
+    store = state.StateStore(path, delay=0.1, replace=replace, retry_max=0.4)
+    with caplog.at_level("DEBUG"):
+        store.update(last_bat="b", stopped=False)
+        time.sleep(1.6)
+    # Attempts at ~0.1, 0.2, 0.4, 0.8, 1.2, 1.6 s instead of every 0.1 s
+    assert 4 <= replace.calls <= 7
+    errors = [r for r in caplog.records if r.levelname == "ERROR"]
+    assert len(errors) == 1
+
+
+def test_close_does_not_restart_writer(path):
+    replace = FailingReplace()
+    replace.healed = True
+    store = state.StateStore(path, delay=0.01, replace=replace)
+    store.update(last_bat="b", stopped=False)
+    assert wait_for(lambda: read(path)["last_bat"] == "b")
+    store._thread.join(1.0)
+    writer = store._thread
+
+    # As at interpreter exit: the final write fails and nothing is started again
+    replace.healed = False
+    store.close()
+    assert store._thread is writer and not writer.is_alive()
+    assert not store._writer_active
+
+
+def test_close_ends_waiting_writer(tmp_path):
+    store = state.StateStore(tmp_path / "moonstone_state.json", delay=3600)
+    store.update(last_bat="a", stopped=False)
+    store.close()
+    store._thread.join(1.0)
+    assert not store._thread.is_alive()
+    assert read(tmp_path / "moonstone_state.json")["last_bat"] == "a"
@@ -0,0 +1,125 @@
+"""ConnectivityWatchdog sampling, stop and failover hand-off."""
+import os
+import shutil
+import socket
+import ssl
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from src import watchdog
+
+GENERAL = Path("general.bat")
+ALT = Path("alt.bat")
+
+
+def make_watchdog(probe, switch_profile=lambda bat: None, **kwargs):
+    options = dict(probe=probe, hosts_for=lambda bat: ["a", "b", "c", "d", "e"],
+                   clock=time.monotonic, hosts_per_round=5, min_samples=5,
+                   confirm_rounds=1, grace=0.0, window=60.0)
+    options.update(kwargs)
+    return watchdog.ConnectivityWatchdog([GENERAL, ALT], switch_profile, **options)
+
+
+def test_unresolved_hosts_are_not_samples():
+    # Two hosts answer, three do not resolve: 100% success over two samples
+    probe = lambda host, timeout: (True, 0.05) if host in ("a", "b") else (None, None)
+    connectivity_watchdog = make_watchdog(probe, min_samples=1)
+    connectivity_watchdog.set_profile(GENERAL)
+    connectivity_watchdog.run_round()
+    stats = connectivity_watchdog.stats()
+    assert stats["samples"] == 2
+    assert stats["success_rate"] == 1.0
+    assert not stats["degraded"]
+
+
+def test_tls_probe_skips_unresolved_host():
+    assert watchdog.tls_probe("does-not-exist.invalid", timeout=1.0) == (None, None)
+
+
+def test_tls_probe_accepts_certificate_for_another_name(tmp_path):
+    # Like a bare hostlist domain served with a certificate for *.example: the
+    # handshake completes, so the bypass works even though the name does not match
+    if shutil.which("openssl") is None:
+        pytest.skip("openssl is not installed")
+    cert, key = tmp_path / "cert.pem", tmp_path / "key.pem"
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=other.example", "-keyout", str(key), "-out", str(cert)],
+                   check=True, capture_output=True)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server = socket.create_server(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+
+    def serve():
+        conn, _ = server.accept()
+        try:
+            with context.wrap_socket(conn, server_side=True):
+                pass
+        except OSError:
+            pass
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    try:
+        ok, latency = watchdog.tls_probe("127.0.0.1", timeout=5.0, port=port)
+    finally:
+        thread.join(5)
+        server.close()
+    assert ok is True
+    assert latency is not None
+
+
+def test_failover_switches_to_next_profile(state_store):
+    switched = []
+    connectivity_watchdog = make_watchdog(lambda host, timeout: (False, None),
+                                          switch_profile=switched.append)
+    connectivity_watchdog.set_profile(GENERAL)
+    connectivity_watchdog.run_round()
+    assert switched == [ALT]
+    assert connectivity_watchdog.profile == ALT
+    assert state_store.profile_history()["general"]["last_failure"] is not None
+
+
+def test_stop_does_not_wait_for_probes_in_flight():
+    release = threading.Event()
+
+    def probe(host, timeout):
+        release.wait(5)
+        return False, None
+
+    switched = []
+    connectivity_watchdog = make_watchdog(probe, switch_profile=switched.append, interval=0.01)
+    connectivity_watchdog.set_profile(GENERAL)
+    connectivity_watchdog.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    connectivity_watchdog.stop()
+    assert time.monotonic() - started < 0.5
+    release.set()
+    time.sleep(0.1)
+    # Results of the round in flight are dropped after stop()
+    assert switched == []
+    assert connectivity_watchdog.stats()["samples"] == 0
+
+
+def test_profile_switcher_runs_on_gui_thread():
+    pytest.importorskip("PyQt5")
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    from benchmarks.fakes import windows_fakes
+    with windows_fakes():  # src.ui imports the Windows-only autostart module
+        from src import ui
+
+    app = QApplication.instance() or QApplication([])
+    called = []
+    switcher = ui.ProfileSwitcher(lambda bat: called.append((bat, threading.current_thread())))
+    worker = threading.Thread(target=switcher.requested.emit, args=(ALT,))
+    worker.start()
+    worker.join()
+    assert called == []
+    app.processEvents()
+    assert called == [(ALT, threading.main_thread())]